@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import click
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import squareform
+
+from scripts.compiled_schema import CompiledSchema
+
+logger = logging.getLogger(__name__)
+
+CLASS_DISTANCES_FORMAT = 1
+
+KINDS = ["checklist", "extension", "combination"]
+
+
+def class_fingerprint(compiled: CompiledSchema, class_name: str) -> str:
+    """A hash of a class's induced slots and their required/recommended status."""
+    digest = hashlib.sha256()
+    for slot_name in sorted(compiled.classes[class_name]):
+        rule = compiled.classes[class_name][slot_name]
+        digest.update(f"{slot_name}:{int(rule.required)}{int(rule.recommended)}\n".encode())
+    return digest.hexdigest()
+
+
+def slot_weights(compiled: CompiledSchema, class_names: Sequence[str], slot_names: Sequence[str],
+                 weights: Tuple[float, float, float]) -> np.ndarray:
+    """(classes x slots) weights: required, recommended or optional weight where a class has the slot, else 0."""
+    required_weight, recommended_weight, optional_weight = weights
+    slot_columns = {slot_name: column for column, slot_name in enumerate(slot_names)}
+    matrix = np.zeros((len(class_names), len(slot_names)))
+    for row, class_name in enumerate(class_names):
+        for slot_name, rule in compiled.classes[class_name].items():
+            if rule.required:
+                weight = required_weight
+            elif rule.recommended:
+                weight = recommended_weight
+            else:
+                weight = optional_weight
+            matrix[row, slot_columns[slot_name]] = weight
+    return matrix
+
+
+def weighted_jaccard_row(matrix: np.ndarray, row: int) -> np.ndarray:
+    """1 - sum(min) / sum(max) between one class's slot weights and every class's."""
+    minimums = np.minimum(matrix[row], matrix).sum(axis=1)
+    maximums = np.maximum(matrix[row], matrix).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(maximums > 0, 1.0 - minimums / maximums, 0.0)
+
+
+class ClassDistances:
+    """
+    Weighted Jaccard distances between MIxS classes, cached by per-class fingerprint.
+
+    Each class is a vector of slot weights: required, recommended or optional weight for the
+    slots it has, after slot_usage, and 0 for the rest. The cache keeps the square distance
+    matrix with each class's fingerprint. On the next run, distances between classes whose
+    fingerprints are unchanged are copied over, and only the rows of new or changed classes are
+    recomputed.
+    """
+
+    def __init__(self, class_names: List[str], fingerprints: List[str], weights: Tuple[float, float, float],
+                 distances: np.ndarray):
+        self.class_names = class_names
+        self.fingerprints = fingerprints
+        self.weights = weights
+        self.distances = distances
+
+    @classmethod
+    def compute(cls, compiled: CompiledSchema, class_names: List[str], weights: Tuple[float, float, float],
+                cache_file: Optional[str] = None) -> Tuple["ClassDistances", int]:
+        """Returns the distances and how many rows had to be recomputed."""
+        fingerprints = [class_fingerprint(compiled, class_name) for class_name in class_names]
+        distances = np.zeros((len(class_names), len(class_names)))
+        stale = np.ones(len(class_names), dtype=bool)
+
+        cached = cls.load(cache_file) if cache_file and os.path.isfile(cache_file) else None
+        if cached is not None and tuple(cached.weights) == tuple(weights):
+            cached_positions = {
+                (class_name, fingerprint): position
+                for position, (class_name, fingerprint) in enumerate(zip(cached.class_names, cached.fingerprints))
+            }
+            reused = [(position, cached_positions[key])
+                      for position, key in enumerate(zip(class_names, fingerprints)) if key in cached_positions]
+            if reused:
+                new_positions, old_positions = (np.array(positions) for positions in zip(*reused))
+                distances[np.ix_(new_positions, new_positions)] = \
+                    cached.distances[np.ix_(old_positions, old_positions)]
+                stale[new_positions] = False
+
+        stale_rows = np.flatnonzero(stale)
+        if len(stale_rows):
+            slot_names = sorted({slot_name for class_name in class_names for slot_name in compiled.classes[class_name]})
+            matrix = slot_weights(compiled, class_names, slot_names, weights)
+            for row in stale_rows:
+                distances[row, :] = distances[:, row] = weighted_jaccard_row(matrix, row)
+
+        class_distances = cls(class_names, fingerprints, weights, distances)
+        if cache_file:
+            class_distances.save(cache_file)
+        return class_distances, len(stale_rows)
+
+    @classmethod
+    def load(cls, cache_file: str) -> Optional["ClassDistances"]:
+        with np.load(cache_file, allow_pickle=False) as stored:
+            meta = json.loads(str(stored["meta"]))
+            if meta["format"] != CLASS_DISTANCES_FORMAT:
+                return None
+            return cls(meta["class_names"], meta["fingerprints"], tuple(meta["weights"]), stored["distances"])
+
+    def save(self, cache_file: str):
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        meta = {"format": CLASS_DISTANCES_FORMAT, "class_names": self.class_names,
+                "fingerprints": self.fingerprints, "weights": list(self.weights)}
+        with open(cache_file, "wb") as cache_handle:
+            np.savez(cache_handle, meta=np.array(json.dumps(meta)), distances=self.distances)
+
+    def linkage(self, method: str) -> np.ndarray:
+        return hierarchy.linkage(squareform(self.distances, checks=False), method=method)
+
+
+def linkage_tree(node: hierarchy.ClusterNode, labels: Sequence[str]) -> Dict[str, Any]:
+    if node.is_leaf():
+        return {"name": labels[node.id]}
+    return {
+        "id": node.id,
+        "distance": round(float(node.dist), 6),
+        "count": node.count,
+        "children": [linkage_tree(node.left, labels), linkage_tree(node.right, labels)],
+    }
+
+
+def linkage_document(linkage_matrix: np.ndarray, class_names: List[str], class_kinds: Dict[str, str],
+                     leaves: List[int], method: str, weights: Tuple[float, float, float]) -> Dict[str, Any]:
+    """
+    The linkage as JSON: scipy's linkage rows, the dendrogram's leaf order and the same tree
+    nested, which d3.hierarchy and most dashboard libraries take directly.
+    """
+    return {
+        "method": method,
+        "metric": "weighted_jaccard",
+        "weights": dict(zip(["required", "recommended", "optional"], weights)),
+        "classes": [{"name": class_name, "kind": class_kinds[class_name]} for class_name in class_names],
+        "linkage": [[int(left), int(right), round(float(distance), 6), int(count)]
+                    for left, right, distance, count in linkage_matrix],
+        "leaves": [class_names[leaf] for leaf in leaves],
+        "tree": linkage_tree(hierarchy.to_tree(linkage_matrix), class_names),
+    }
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--compiled-cache', default='project/mixs-compiled.json',
+              help='Compiled schema cache; rebuilt when the schema changes (default: project/mixs-compiled.json)')
+@click.option('--distance-cache', default='project/mixs-class-distances.npz',
+              help='Distance matrix cache, reused for classes whose slots are unchanged '
+                   '(default: project/mixs-class-distances.npz)')
+@click.option('--output', '-o', default='mixs-classes-dendrogram.pdf',
+              help='Dendrogram PDF; the linkage JSON is written next to it (default: mixs-classes-dendrogram.pdf)')
+@click.option('--kinds', '-k', multiple=True, type=click.Choice(KINDS), default=KINDS,
+              help='Kinds of class to cluster; repeatable (default: all)')
+@click.option('--method', type=click.Choice(['single', 'complete', 'average', 'weighted']), default='complete',
+              help='Linkage method (default: complete)')
+@click.option('--required-weight', default=3.0, type=float, help='Weight of a required slot (default: 3)')
+@click.option('--recommended-weight', default=2.0, type=float, help='Weight of a recommended slot (default: 2)')
+@click.option('--optional-weight', default=1.0, type=float, help='Weight of any other slot (default: 1)')
+def cluster_classes(schema, compiled_cache, distance_cache, output, kinds, method, required_weight,
+                    recommended_weight, optional_weight):
+    """
+    Clusters MIxS Checklists, Extensions and combination classes by weighted slot overlap, without
+    opening a window.
+    """
+    logging.basicConfig(level=logging.INFO)
+    # render straight to the PDF, with no window to block on
+    plt.switch_backend("Agg")
+    compiled = CompiledSchema.load(schema, compiled_cache)
+    class_names = sorted(class_name for class_name, kind in compiled.class_kinds.items() if kind in kinds)
+    weights = (required_weight, recommended_weight, optional_weight)
+
+    class_distances, recomputed = ClassDistances.compute(compiled, class_names, weights, distance_cache)
+    logger.info(f"Recomputed distances for {recomputed} of {len(class_names)} classes")
+    linkage_matrix = class_distances.linkage(method)
+
+    plt.figure(figsize=(max(14, len(class_names) * 0.12), 10))
+    dendrogram = hierarchy.dendrogram(linkage_matrix, labels=class_names, orientation='top', leaf_font_size=5)
+    plt.title('Similarity of MIxS Classes by Weighted Term Usage')
+    plt.ylabel('Weighted Jaccard distance')
+    plt.xlabel('Classes')
+    plt.tight_layout()
+    plt.savefig(output, format='pdf')
+    plt.close()
+
+    linkage_file = os.path.splitext(output)[0] + ".json"
+    with open(linkage_file, "w") as linkage_handle:
+        json.dump(linkage_document(linkage_matrix, class_names, compiled.class_kinds, dendrogram["leaves"], method,
+                                   weights), linkage_handle)
+    logger.info(f"Wrote {output} and {linkage_file}")
+
+
+if __name__ == '__main__':
+    cluster_classes()
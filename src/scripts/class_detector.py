@@ -0,0 +1,302 @@
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import click
+import numpy as np
+import yaml
+
+from scripts.compiled_schema import CompiledSchema
+
+logger = logging.getLogger(__name__)
+
+# records scored per vectorized step; small enough that the (records x classes) temporaries stay in cache
+BATCH_SIZE = 128
+
+# bits given to each ranking key when they are packed into one int64; coverages are quantized to
+# 2^-20, finer than the gap between any two distinct fractions with denominators below 1024
+COVERAGE_BITS = 20
+COUNT_BITS = 10
+
+if hasattr(np, "bitwise_count"):
+    bitwise_count = np.bitwise_count
+else:
+    BYTE_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+    def bitwise_count(words: np.ndarray) -> np.ndarray:
+        as_bytes = np.ascontiguousarray(words).view(np.uint8).reshape(words.shape + (8,))
+        return BYTE_POPCOUNT[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per row, summed over the last (word) axis."""
+    return bitwise_count(words).sum(axis=-1, dtype=np.int64)
+
+
+def overlap_counts(rows: np.ndarray, layer: np.ndarray) -> np.ndarray:
+    """
+    popcount(row & class) for every (row, class) pair. Looping over the handful of words keeps
+    the temporaries at (rows x classes) instead of (rows x classes x words).
+    """
+    counts = np.zeros((rows.shape[0], layer.shape[0]), dtype=np.uint16)
+    anded = np.empty((rows.shape[0], layer.shape[0]), dtype=np.uint64)
+    for word in range(rows.shape[1]):
+        np.bitwise_and(rows[:, word, None], layer[None, :, word], out=anded)
+        counts += bitwise_count(anded)
+    return counts.astype(np.int64)
+
+
+def pack_rows(present: np.ndarray) -> np.ndarray:
+    """Packs a (rows x slots) boolean matrix into (rows x words) uint64 bitsets."""
+    packed = np.packbits(present, axis=1, bitorder="little")
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+class ClassDetector:
+    """
+    Ranks MIxS classes by how well a record's filled-in slots fit them.
+
+    Every slot in the compiled schema gets a bit. Each candidate class has three bitset layers
+    over those bits: all of its induced slots, its required slots and its recommended slots (both
+    after slot_usage). A record is encoded into the same bit space once. Against every class at
+    once it is then scored by popcounts of ANDed words:
+
+      required_coverage     filled required slots / required slots
+      recommended_coverage  filled recommended slots / recommended slots
+      extraneous_fraction   filled fields the class doesn't have / filled fields
+
+    Classes are ranked by required coverage, then fewest extraneous fields, then recommended
+    coverage, then fewest slots, so the most specific class that explains the record wins.
+    """
+
+    def __init__(self, compiled: CompiledSchema, kinds: Sequence[str] = ("combination",)):
+        self.compiled = compiled
+        self.class_names = sorted(
+            class_name for class_name, kind in compiled.class_kinds.items() if kind in kinds)
+        if not self.class_names:
+            raise ValueError(f"no {'/'.join(kinds)} classes in the compiled schema")
+        self.slot_names = sorted(compiled.slots)
+        self.slot_bits = {slot_name: bit for bit, slot_name in enumerate(self.slot_names)}
+        # submitters often fill in column titles rather than slot names
+        for slot_name, rule in compiled.slots.items():
+            if rule.title and rule.title not in self.slot_bits:
+                self.slot_bits[rule.title] = self.slot_bits[slot_name]
+
+        allowed = np.zeros((len(self.class_names), len(self.slot_names)), dtype=bool)
+        required = np.zeros_like(allowed)
+        recommended = np.zeros_like(allowed)
+        for row, class_name in enumerate(self.class_names):
+            for slot_name, rule in compiled.classes[class_name].items():
+                bit = self.slot_bits[slot_name]
+                allowed[row, bit] = True
+                required[row, bit] = rule.required
+                recommended[row, bit] = rule.recommended
+
+        self.allowed = pack_rows(allowed)
+        self.required = pack_rows(required)
+        self.recommended = pack_rows(recommended)
+        self.allowed_counts = popcount(self.allowed)
+        self.required_counts = popcount(self.required)
+        self.recommended_counts = popcount(self.recommended)
+
+    def encode(self, records: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encodes records as (records x words) bitsets of their filled-in slots, plus the number of
+        filled fields per record that aren't MIxS slots at all.
+        """
+        slot_bits = self.slot_bits
+        slot_count = len(self.slot_names)
+        positions: List[int] = []
+        unknown: List[int] = []
+        for row, record in enumerate(records):
+            offset = row * slot_count
+            unknown_fields = 0
+            for field_name, value in record.items():
+                if value is None or value == "" or value == []:
+                    continue
+                bit = slot_bits.get(field_name)
+                if bit is None:
+                    unknown_fields += 1
+                else:
+                    positions.append(offset + bit)
+            unknown.append(unknown_fields)
+
+        present = np.zeros((len(unknown), slot_count), dtype=bool)
+        present.ravel()[positions] = True
+        return pack_rows(present), np.array(unknown, dtype=np.int64)
+
+    def score(self, words: np.ndarray, unknown: np.ndarray) -> Dict[str, np.ndarray]:
+        """Scores encoded records against every candidate class; each result is (records x classes)."""
+        filled = popcount(words)[:, None] + unknown[:, None]
+        extraneous = filled - overlap_counts(words, self.allowed)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "required_coverage": np.where(
+                    self.required_counts > 0, overlap_counts(words, self.required) / self.required_counts, 1.0),
+                "recommended_coverage": np.where(
+                    self.recommended_counts > 0,
+                    overlap_counts(words, self.recommended) / self.recommended_counts, 1.0),
+                "extraneous_fraction": np.where(filled > 0, extraneous / filled, 0.0),
+                "extraneous": extraneous,
+            }
+
+    def order(self, scores: Dict[str, np.ndarray], top: int) -> np.ndarray:
+        """
+        Per record, the top candidate class positions from best to worst fit. The ranking keys
+        are packed into one int64 per (record, class), so only the top few need sorting.
+        """
+        coverage_scale = float(1 << COVERAGE_BITS)
+        count_limit = (1 << COUNT_BITS) - 1
+        rank_keys = np.floor(scores["required_coverage"] * coverage_scale).astype(np.int64)
+        rank_keys <<= COUNT_BITS
+        rank_keys |= count_limit - np.minimum(scores["extraneous"], count_limit)
+        rank_keys <<= COVERAGE_BITS + 1
+        rank_keys |= np.floor(scores["recommended_coverage"] * coverage_scale).astype(np.int64)
+        rank_keys <<= COUNT_BITS
+        rank_keys |= count_limit - np.minimum(self.allowed_counts, count_limit)
+
+        top = min(top, rank_keys.shape[1])
+        if top < rank_keys.shape[1]:
+            candidates = np.argpartition(-rank_keys, top - 1, axis=1)[:, :top]
+        else:
+            candidates = np.broadcast_to(np.arange(rank_keys.shape[1]), rank_keys.shape)
+        candidate_keys = np.take_along_axis(rank_keys, candidates, axis=1)
+        return np.take_along_axis(candidates, np.argsort(-candidate_keys, axis=1, kind="stable"), axis=1)
+
+    def missing_required(self, record_words: np.ndarray, class_position: int) -> List[str]:
+        missing = self.required[class_position] & ~record_words
+        missing_bits = np.flatnonzero(np.unpackbits(missing.view(np.uint8), bitorder="little"))
+        return [self.slot_names[bit] for bit in missing_bits if bit < len(self.slot_names)]
+
+    def rankings(self, words: np.ndarray, unknown: np.ndarray, top: int) -> Iterator[List[Dict[str, Any]]]:
+        for start in range(0, len(words), BATCH_SIZE):
+            batch_words, batch_unknown = words[start:start + BATCH_SIZE], unknown[start:start + BATCH_SIZE]
+            scores = self.score(batch_words, batch_unknown)
+            orders = self.order(scores, top)
+            for row, order in enumerate(orders):
+                yield [
+                    {
+                        "class": self.class_names[position],
+                        "kind": self.compiled.class_kinds[self.class_names[position]],
+                        "required_coverage": round(float(scores["required_coverage"][row, position]), 4),
+                        "recommended_coverage": round(float(scores["recommended_coverage"][row, position]), 4),
+                        "extraneous_fraction": round(float(scores["extraneous_fraction"][row, position]), 4),
+                        "missing_required": self.missing_required(batch_words[row], position),
+                    }
+                    for position in order
+                ]
+
+    def rank(self, record: Dict[str, Any], top: int = 5) -> List[Dict[str, Any]]:
+        """The top candidate classes for one record, best first."""
+        return next(self.rankings(*self.encode([record]), top))
+
+    def rank_batch(self, records: Iterable[Dict[str, Any]], top: int = 5) -> Iterator[List[Dict[str, Any]]]:
+        """Ranks many records, encoding and scoring them BATCH_SIZE at a time."""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= BATCH_SIZE:
+                yield from self.rankings(*self.encode(batch), top)
+                batch = []
+        if batch:
+            yield from self.rankings(*self.encode(batch), top)
+
+    def best_classes(self, records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """Just the best-fitting class name per record, for bulk routing; skips building the score dicts."""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= BATCH_SIZE:
+                yield from self.best_of(batch)
+                batch = []
+        if batch:
+            yield from self.best_of(batch)
+
+    def best_of(self, records: List[Dict[str, Any]]) -> List[str]:
+        best = self.order(self.score(*self.encode(records)), 1)[:, 0]
+        return [self.class_names[position] for position in best]
+
+    def rank_sheet(self, records: Iterable[Dict[str, Any]], top: int = 5) -> List[Dict[str, Any]]:
+        """
+        Ranks classes for a whole sheet, as one record made of every field filled in on any row.
+        """
+        filled_fields: Dict[str, bool] = {}
+        for record in records:
+            for field_name, value in record.items():
+                if field_name not in filled_fields and value is not None and value != "" and value != []:
+                    filled_fields[field_name] = True
+        return self.rank(filled_fields, top)
+
+
+def read_unlabeled_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yields records from a sheet or file whose class isn't known: .xlsx/.tsv/.csv with a header
+    row, .jsonl records, or a .yaml/.json list of records or MixsCompliantData document.
+    """
+    if path.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            for row in rows:
+                yield {column: value for column, value in zip(header, row) if column}
+        finally:
+            workbook.close()
+    elif path.endswith((".tsv", ".csv")):
+        import csv
+
+        with open(path, newline="") as table_handle:
+            yield from csv.DictReader(table_handle, delimiter="\t" if path.endswith(".tsv") else ",")
+    elif path.endswith(".jsonl"):
+        with open(path) as jsonl_handle:
+            for line in jsonl_handle:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path) as document_handle:
+            document = json.load(document_handle) if path.endswith(".json") else yaml.safe_load(document_handle)
+        if isinstance(document, list):
+            yield from document
+        elif isinstance(document, dict):
+            for records in document.values():
+                yield from records or []
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--compiled-cache', default='project/mixs-compiled.json',
+              help='Compiled schema cache; rebuilt when the schema changes (default: project/mixs-compiled.json)')
+@click.option('--input', '-i', 'input_file', type=click.Path(exists=True, dir_okay=False), required=True,
+              help='Records whose class is unknown: .xlsx, .tsv, .csv, .jsonl, .yaml or .json')
+@click.option('--top', default=5, type=int, help='Candidate classes to report (default: 5)')
+@click.option('--all-classes', is_flag=True, default=False,
+              help='Rank Checklists and Extensions too, not just combination classes')
+@click.option('--per-record', is_flag=True, default=False,
+              help='Rank each record separately (JSON lines) instead of the sheet as a whole')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='Output file (default: stdout)')
+def detect_class(schema, compiled_cache, input_file, top, all_classes, per_record, output):
+    """
+    Ranks the MIxS classes that best fit records submitted without one.
+    """
+    logging.basicConfig(level=logging.INFO)
+    compiled = CompiledSchema.load(schema, compiled_cache)
+    kinds = ("combination", "checklist", "extension") if all_classes else ("combination",)
+    detector = ClassDetector(compiled, kinds)
+    records = read_unlabeled_records(input_file)
+    if per_record:
+        for row, ranking in enumerate(detector.rank_batch(records, top)):
+            output.write(json.dumps({"record": row, "candidates": ranking}) + "\n")
+    else:
+        yaml.safe_dump(detector.rank_sheet(records, top), output, sort_keys=False)
+
+
+if __name__ == '__main__':
+    detect_class()
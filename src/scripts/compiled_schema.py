@@ -0,0 +1,321 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, asdict, field
+from typing import Any, Callable, Dict, List, Optional
+
+import click
+from linkml_runtime import SchemaView
+
+logger = logging.getLogger(__name__)
+
+COMPILED_SCHEMA_FORMAT = 2
+
+CONTAINER_CLASS = "MixsCompliantData"
+
+NUMERIC_RANGES = {"float", "double", "decimal"}
+
+# the class kinds that the per-record tools need to tell apart
+CLASS_PARENTS = ["Checklist", "Extension"]
+
+
+@dataclass
+class SlotRule:
+    """Everything needed to check one induced slot of one class, without a SchemaView."""
+    name: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    slot_uri: Optional[str] = None
+    range: str = "string"
+    required: bool = False
+    recommended: bool = False
+    multivalued: bool = False
+    pattern: Optional[str] = None
+    structured_pattern: Optional[str] = None
+    permissible_values: Optional[List[str]] = None
+    regex: Optional[Any] = field(default=None, repr=False, compare=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        as_dict = asdict(self)
+        del as_dict["regex"]
+        return as_dict
+
+
+def materialize_pattern(syntax: str, settings: Dict[str, str]) -> str:
+    """
+    Interpolates {setting} references in a structured_pattern syntax string, the way gen-linkml
+    --materialize-patterns does.
+    """
+    materialized = syntax
+    for setting_name, setting_value in settings.items():
+        materialized = materialized.replace("{" + setting_name + "}", setting_value)
+    return materialized
+
+
+def schema_fingerprint(schema_file: str) -> str:
+    with open(schema_file, "rb") as schema_handle:
+        return hashlib.sha256(schema_handle.read()).hexdigest()
+
+
+class CompiledSchema:
+    """
+    A precompiled, JSON-serializable digest of the induced MIxS classes.
+
+    Inducing every Checklist, Extension and combination class with SchemaView takes tens of
+    seconds, so this digest is built once (or loaded from a cache file keyed by the schema's
+    sha256) and then shared by the per-record tools.
+    """
+
+    def __init__(self, fingerprint: str, version: Optional[str], settings: Dict[str, str],
+                 classes: Dict[str, Dict[str, SlotRule]], class_kinds: Dict[str, str],
+                 container_slots: Dict[str, str]):
+        self.fingerprint = fingerprint
+        self.version = version
+        self.settings = settings
+        self.classes = classes
+        self.class_kinds = class_kinds
+        self.container_slots = container_slots
+        self.slots: Dict[str, SlotRule] = {}
+        for class_rules in classes.values():
+            for slot_name, rule in class_rules.items():
+                self.slots.setdefault(slot_name, rule)
+        self.date_time_stamp = re.compile("^" + settings["date_time_stamp"]) \
+            if "date_time_stamp" in settings else None
+        self.compile_patterns()
+
+    @classmethod
+    def from_schema(cls, schema_file: str) -> "CompiledSchema":
+        schema_view = SchemaView(schema_file)
+        settings = {k: v.setting_value for k, v in (schema_view.schema.settings or {}).items()}
+        enums = {
+            enum_name: sorted(enum_obj.permissible_values.keys())
+            for enum_name, enum_obj in schema_view.all_enums().items()
+        }
+
+        class_kinds: Dict[str, str] = {}
+        for parent_class in CLASS_PARENTS:
+            for class_name in schema_view.class_descendants(parent_class, reflexive=False):
+                class_obj = schema_view.get_class(class_name)
+                if "combination_classes" in class_obj.in_subset:
+                    class_kinds[class_name] = "combination"
+                else:
+                    class_kinds.setdefault(class_name, parent_class.lower())
+
+        classes: Dict[str, Dict[str, SlotRule]] = {}
+        for class_name in sorted(class_kinds):
+            logger.info(f"Compiling {class_name}")
+            class_rules = {}
+            for slot_name, slot_obj in schema_view.induced_class(class_name).attributes.items():
+                structured_pattern = None
+                pattern = slot_obj.pattern
+                if slot_obj.structured_pattern and slot_obj.structured_pattern.syntax:
+                    structured_pattern = slot_obj.structured_pattern.syntax
+                    if slot_obj.structured_pattern.interpolated:
+                        pattern = materialize_pattern(structured_pattern, settings)
+                class_rules[slot_name] = SlotRule(
+                    name=slot_name,
+                    title=slot_obj.title,
+                    description=slot_obj.description,
+                    slot_uri=slot_obj.slot_uri,
+                    range=slot_obj.range or schema_view.schema.default_range or "string",
+                    required=bool(slot_obj.required),
+                    recommended=bool(slot_obj.recommended),
+                    multivalued=bool(slot_obj.multivalued),
+                    pattern=str(pattern) if pattern else None,
+                    structured_pattern=structured_pattern,
+                    permissible_values=enums.get(slot_obj.range),
+                )
+            classes[class_name] = class_rules
+
+        container_slots = {
+            slot_name: slot_obj.range
+            for slot_name, slot_obj in schema_view.induced_class(CONTAINER_CLASS).attributes.items()
+        }
+
+        return cls(
+            fingerprint=schema_fingerprint(schema_file),
+            version=schema_view.schema.version,
+            settings=settings,
+            classes=classes,
+            class_kinds=class_kinds,
+            container_slots=container_slots,
+        )
+
+    @classmethod
+    def load(cls, schema_file: str, cache_file: Optional[str] = None) -> "CompiledSchema":
+        """
+        Returns the compiled schema, reusing cache_file when it was built from the same schema
+        content and rewriting it otherwise.
+        """
+        if cache_file and os.path.isfile(cache_file):
+            with open(cache_file) as cache_handle:
+                cached = json.load(cache_handle)
+            if (cached.get("format") == COMPILED_SCHEMA_FORMAT
+                    and cached.get("fingerprint") == schema_fingerprint(schema_file)):
+                return cls.from_dict(cached)
+            logger.info(f"{cache_file} is stale, recompiling {schema_file}")
+
+        compiled = cls.from_schema(schema_file)
+        if cache_file:
+            compiled.save(cache_file)
+        return compiled
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompiledSchema":
+        rules = [SlotRule(**rule) for rule in data["rules"]]
+        classes = {
+            class_name: {slot_name: rules[rule_index] for slot_name, rule_index in class_rules.items()}
+            for class_name, class_rules in data["classes"].items()
+        }
+        return cls(
+            fingerprint=data["fingerprint"],
+            version=data.get("version"),
+            settings=data["settings"],
+            classes=classes,
+            class_kinds=data["class_kinds"],
+            container_slots=data["container_slots"],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Most classes share identical induced slots, so each distinct rule is stored once and the
+        classes refer to it by index.
+        """
+        rules: List[Dict[str, Any]] = []
+        rule_indexes: Dict[str, int] = {}
+        classes: Dict[str, Dict[str, int]] = {}
+        for class_name, class_rules in self.classes.items():
+            classes[class_name] = {}
+            for slot_name, rule in class_rules.items():
+                rule_dict = rule.to_dict()
+                rule_key = json.dumps(rule_dict, sort_keys=True)
+                if rule_key not in rule_indexes:
+                    rule_indexes[rule_key] = len(rules)
+                    rules.append(rule_dict)
+                classes[class_name][slot_name] = rule_indexes[rule_key]
+
+        return {
+            "format": COMPILED_SCHEMA_FORMAT,
+            "fingerprint": self.fingerprint,
+            "version": self.version,
+            "settings": self.settings,
+            "class_kinds": self.class_kinds,
+            "container_slots": self.container_slots,
+            "rules": rules,
+            "classes": classes,
+        }
+
+    def save(self, cache_file: str):
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, "w") as cache_handle:
+            json.dump(self.to_dict(), cache_handle)
+
+    def compile_patterns(self, compile_pattern: Callable[[str], Any] = re.compile):
+        """
+        Compiles each distinct pattern once. Many slots share a handful of materialized patterns,
+        so the compiled objects are shared between SlotRules. compile_pattern can swap in another
+        engine, see regex_safety.pattern_compiler; it only needs to return an object with search().
+        """
+        compiled_patterns: Dict[str, Any] = {}
+        for class_rules in self.classes.values():
+            for rule in class_rules.values():
+                if rule.pattern is None:
+                    continue
+                if rule.pattern not in compiled_patterns:
+                    compiled_patterns[rule.pattern] = compile_pattern(rule.pattern)
+                rule.regex = compiled_patterns[rule.pattern]
+
+    def class_for_container_slot(self, container_slot: str) -> Optional[str]:
+        return self.container_slots.get(container_slot)
+
+    def check_value(self, rule: SlotRule, value: Any) -> Optional[Dict[str, Any]]:
+        """Checks one scalar value against a slot rule. Returns an error dict or None."""
+        if rule.permissible_values is not None:
+            if str(value) not in rule.permissible_values:
+                return {"rule": "enum", "message": f"{value!r} is not a permissible value of {rule.range}"}
+            return None
+        if rule.range == "integer":
+            try:
+                int(str(value))
+            except ValueError:
+                return {"rule": "range", "message": f"{value!r} is not an integer"}
+            return None
+        if rule.range in NUMERIC_RANGES:
+            try:
+                float(str(value))
+            except ValueError:
+                return {"rule": "range", "message": f"{value!r} is not a {rule.range}"}
+            return None
+        if rule.range == "datetime" and self.date_time_stamp is not None:
+            if not self.date_time_stamp.match(str(value)):
+                return {"rule": "range", "message": f"{value!r} is not an ISO8601 date/time stamp"}
+            return None
+        if rule.regex is not None:
+            try:
+                matched = rule.regex.search(str(value))
+            except TimeoutError as e:
+                return {"rule": "pattern_budget", "message": str(e)}
+            if not matched:
+                return {"rule": "pattern", "message": f"{value!r} does not match {rule.pattern}"}
+        return None
+
+    def validate_record(self, class_name: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Validates one flat record (slot name -> value) against an induced class.
+
+        Returns a list of per-field error dicts with "slot", "rule", "message" and, where there is
+        one, the offending "value".
+        """
+        if class_name not in self.classes:
+            return [{"slot": None, "rule": "class", "message": f"unknown class {class_name}"}]
+        class_rules = self.classes[class_name]
+        errors = []
+
+        for slot_name, rule in class_rules.items():
+            if rule.required and record.get(slot_name) in (None, "", []):
+                errors.append({"slot": slot_name, "rule": "required", "message": "required slot is missing"})
+
+        for slot_name, value in record.items():
+            if value is None:
+                continue
+            rule = class_rules.get(slot_name)
+            if rule is None:
+                errors.append({"slot": slot_name, "rule": "undeclared",
+                               "message": f"{slot_name} is not a slot of {class_name}", "value": value})
+                continue
+            if isinstance(value, list):
+                if not rule.multivalued:
+                    errors.append({"slot": slot_name, "rule": "multivalued",
+                                   "message": "slot is single-valued but got a list", "value": value})
+                    continue
+                values = value
+            else:
+                values = [value]
+            for current_value in values:
+                error = self.check_value(rule, current_value)
+                if error:
+                    errors.append({"slot": slot_name, **error, "value": current_value})
+
+        return errors
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--output', '-o', default='project/mixs-compiled.json',
+              help='Where to write the compiled schema cache (default: project/mixs-compiled.json)')
+def compile_schema(schema, output):
+    logging.basicConfig(level=logging.INFO)
+    compiled = CompiledSchema.from_schema(schema)
+    compiled.save(output)
+    logger.info(f"Compiled {len(compiled.classes)} classes into {output}")
+
+
+if __name__ == '__main__':
+    compile_schema()
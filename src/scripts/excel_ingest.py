@@ -0,0 +1,232 @@
+import datetime
+import json
+import logging
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import click
+from openpyxl import load_workbook
+
+from scripts.compiled_schema import CompiledSchema, SlotRule
+
+logger = logging.getLogger(__name__)
+
+# LinkML's tabular loaders delimit multivalued cells with |, optionally wrapped in [ ]
+MULTIVALUED_DELIMITER = "|"
+
+
+class TemplateReader:
+    """
+    Streams records out of a filled-in MIxS Excel template.
+
+    The workbook is opened in openpyxl's read-only mode, which parses the sheet XML lazily, so memory
+    stays flat however many rows the submitter filled in. The template's class is taken from the
+    class_name argument, or else from the sheet title or file name, which gen-excel and
+    organize_files.py both set to the class name. Header cells are mapped to that class's slots by
+    slot name, falling back to slot title.
+    """
+
+    def __init__(self, path: str, compiled: CompiledSchema, class_name: Optional[str] = None,
+                 drop_unknown_columns: bool = False):
+        self.path = path
+        self.compiled = compiled
+        self.drop_unknown_columns = drop_unknown_columns
+        self.workbook = load_workbook(path, read_only=True, data_only=True)
+
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if class_name is None:
+            class_name = next((title for title in self.workbook.sheetnames if title in compiled.classes), None)
+        if class_name is None and stem in compiled.classes:
+            class_name = stem
+        if class_name is None:
+            self.workbook.close()
+            raise click.ClickException(
+                f"can't tell which MIxS class {path} is a template for, since neither its file name nor its "
+                f"sheets ({', '.join(self.workbook.sheetnames)}) are class names; pass --class-name if it is one")
+        if class_name not in compiled.classes:
+            self.workbook.close()
+            raise click.ClickException(f"{class_name} is not a MIxS Checklist, Extension or combination class")
+        self.class_name = class_name
+        self.container_slot = next(
+            (slot for slot, range_class in compiled.container_slots.items() if range_class == class_name), None)
+
+        self.worksheet = self.workbook[class_name] if class_name in self.workbook.sheetnames \
+            else self.workbook.worksheets[0]
+        self.columns: List[Optional[SlotRule]] = []
+        self.column_slots: List[Optional[str]] = []
+        self.unknown_columns: List[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.workbook.close()
+
+    def map_header(self, header: Tuple[Any, ...]):
+        class_rules = self.compiled.classes[self.class_name]
+        rules_by_title = {rule.title: rule for rule in class_rules.values() if rule.title}
+        for cell in header:
+            column = str(cell).strip() if cell is not None else ""
+            rule = class_rules.get(column) or rules_by_title.get(column)
+            if rule is not None:
+                self.columns.append(rule)
+                self.column_slots.append(rule.name)
+            elif column:
+                self.unknown_columns.append(column)
+                self.columns.append(None)
+                self.column_slots.append(None if self.drop_unknown_columns else column)
+            else:
+                self.columns.append(None)
+                self.column_slots.append(None)
+        if header and not any(self.columns):
+            raise click.ClickException(f"{self.path}: no column of sheet {self.worksheet.title} is a "
+                                       f"{self.class_name} slot, so it isn't a filled-in {self.class_name} template")
+        if self.unknown_columns:
+            logger.warning(f"{self.path}: columns that aren't {self.class_name} slots: {self.unknown_columns}")
+
+    @staticmethod
+    def convert_scalar(rule: Optional[SlotRule], value: Any) -> Any:
+        """Turns an Excel-typed cell value into what the slot's range expects."""
+        if isinstance(value, datetime.datetime):
+            # Excel has no date-only type, so a date cell comes back as a datetime at midnight
+            return value.date().isoformat() if value.time() == datetime.time() else value.isoformat()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        if isinstance(value, datetime.time):
+            return value.isoformat()
+        range_name = rule.range if rule else "string"
+        if range_name == "integer":
+            if isinstance(value, float) and value.is_integer():
+                return int(value)
+            if isinstance(value, str):
+                try:
+                    return int(value.strip())
+                except ValueError:
+                    return value
+            return value
+        if range_name in ("float", "double", "decimal"):
+            if isinstance(value, str):
+                try:
+                    return float(value.strip())
+                except ValueError:
+                    return value
+            return value
+        if range_name == "boolean":
+            return value
+        if isinstance(value, float) and value.is_integer():
+            # Excel stores every number as a float; "10" typed into a text slot should stay "10"
+            return str(int(value))
+        return str(value).strip() if isinstance(value, str) else str(value)
+
+    def convert(self, rule: Optional[SlotRule], value: Any) -> Any:
+        if rule is not None and rule.multivalued:
+            if isinstance(value, str):
+                text = value.strip()
+                if text.startswith("[") and text.endswith("]"):
+                    text = text[1:-1]
+                return [self.convert_scalar(rule, part.strip())
+                        for part in text.split(MULTIVALUED_DELIMITER) if part.strip()]
+            return [self.convert_scalar(rule, value)]
+        return self.convert_scalar(rule, value)
+
+    def rows(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yields (worksheet row number, record) for every non-blank row after the header."""
+        row_iterator = self.worksheet.iter_rows(values_only=True)
+        header = next(row_iterator, None)
+        if header is None:
+            return
+        self.map_header(header)
+        columns = list(zip(self.column_slots, self.columns))
+
+        for row_number, row in enumerate(row_iterator, start=2):
+            record = {}
+            for (slot_name, rule), value in zip(columns, row):
+                if slot_name is None or value is None or (isinstance(value, str) and not value.strip()):
+                    continue
+                record[slot_name] = self.convert(rule, value)
+            if record:
+                yield row_number, record
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        for _, record in self.rows():
+            yield record
+
+    def write_protobuf(self, writer, batch_size: int = 1000) -> int:
+        """
+        Writes the records to a MixsProtobufWriter as MixsCompliantData batches of at most
+        batch_size, returning how many were written. Cells the codec can't carry, like "about 300"
+        in an integer slot, are passed through by convert_scalar for validation to report, so a
+        batch that fails to encode is reported by the worksheet row that caused it.
+        """
+        if self.container_slot is None:
+            raise click.ClickException(f"MixsCompliantData has no slot for {self.class_name}")
+        count = 0
+        rows: List[Tuple[int, Dict[str, Any]]] = []
+        for row in self.rows():
+            rows.append(row)
+            if len(rows) >= batch_size:
+                count += self.write_rows(writer, rows)
+                rows = []
+        if rows:
+            count += self.write_rows(writer, rows)
+        return count
+
+    def write_rows(self, writer, rows: List[Tuple[int, Dict[str, Any]]]) -> int:
+        from scripts.protobuf_codec import CONTAINER_MESSAGE
+
+        try:
+            writer.write({self.container_slot: [record for _, record in rows]})
+        except ValueError:
+            # nothing of the batch was written; find the row to blame
+            for row_number, record in rows:
+                try:
+                    writer.proto_schema.encode_message(CONTAINER_MESSAGE, {self.container_slot: [record]})
+                except ValueError as e:
+                    raise click.ClickException(f"{self.path} row {row_number}: {e}")
+            raise
+        return len(rows)
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--compiled-cache', default='project/mixs-compiled.json',
+              help='Compiled schema cache; rebuilt when the schema changes (default: project/mixs-compiled.json)')
+@click.option('--input', '-i', 'input_file', type=click.Path(exists=True, dir_okay=False), required=True,
+              help='Filled-in MIxS .xlsx template')
+@click.option('--class-name', help='MIxS class of the template (default: taken from the sheet or file name)')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Output file (default: stdout)')
+@click.option('--output-format', type=click.Choice(['jsonl', 'protobuf']), default='jsonl',
+              help='jsonl: one record per line; protobuf: length-delimited MixsCompliantData batches')
+@click.option('--proto', default='project/protobuf/mixs.proto', help='Generated .proto file, for protobuf output')
+@click.option('--batch-size', default=1000, type=int, help='Records per protobuf message (default: 1000)')
+@click.option('--drop-unknown-columns', is_flag=True, default=False,
+              help="Leave out columns that aren't slots of the class instead of passing them through")
+def excel_ingest(schema, compiled_cache, input_file, class_name, output, output_format, proto, batch_size,
+                 drop_unknown_columns):
+    """
+    Streams the rows of a filled-in MIxS Excel template out as MixsCompliantData records.
+    """
+    logging.basicConfig(level=logging.INFO)
+    compiled = CompiledSchema.load(schema, compiled_cache)
+    count = 0
+    with TemplateReader(input_file, compiled, class_name, drop_unknown_columns) as reader:
+        if output_format == "protobuf":
+            from scripts.protobuf_codec import MixsProtobufWriter, load_proto_schema
+
+            count = reader.write_protobuf(MixsProtobufWriter(load_proto_schema(schema, proto), output), batch_size)
+        else:
+            for record in reader.records():
+                output.write(json.dumps(record).encode())
+                output.write(b"\n")
+                count += 1
+    logger.info(f"Read {count} {reader.class_name} records from {input_file}")
+
+
+if __name__ == '__main__':
+    excel_ingest()
@@ -0,0 +1,372 @@
+import datetime
+import json
+import re
+import struct
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import click
+import yaml
+from linkml_runtime import SchemaView
+from linkml_runtime.utils.formatutils import lcamelcase
+
+CONTAINER_MESSAGE = "MixsCompliantData"
+
+MESSAGE_RE = re.compile(r"^message\s+(\w+)\s*$")
+FIELD_RE = re.compile(r"^\s*(repeated\s+)?(\w+)\s+(\w+)\s*=\s*(\d+)")
+
+VARINT_TYPES = {"integer": "integer", "boolean": "boolean"}
+STRING_TYPES = {"string", "datetime"}
+ENUM_TYPE_RE = re.compile(r"^[a-z][A-Z0-9]+$")
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH_DELIMITED = 2
+WIRE_FIXED32 = 5
+
+FLOAT32 = struct.Struct("<f")
+FLOAT64 = struct.Struct("<d")
+
+
+class ProtoField(NamedTuple):
+    number: int
+    name: str
+    slot: str
+    kind: str
+    repeated: bool
+    message: Optional[str]
+    tag: bytes
+
+
+def encode_varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(buf: bytes, pos: int):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def signed64(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class ProtoSchema:
+    """
+    The message layouts from the generated project/protobuf/mixs.proto.
+
+    That file is generated without field numbers (every field is "= 0") and without enum
+    definitions, so a field's number is its 1-based position in its message unless the file gives
+    a non-zero number, and enum-typed fields are carried as their permissible value strings. Field
+    names are the lcamelcase form of slot names and are mapped back to the slot names the YAML and
+    JSON data use.
+    """
+
+    def __init__(self, messages: Dict[str, List[ProtoField]]):
+        self.messages = messages
+        self.by_slot = {name: {f.slot: f for f in fields} for name, fields in messages.items()}
+        self.by_number = {name: {f.number: f for f in fields} for name, fields in messages.items()}
+
+    @classmethod
+    def from_proto_file(cls, proto_file: str, slot_names: Iterable[str]) -> "ProtoSchema":
+        slot_by_field_name = {lcamelcase(slot_name): str(slot_name) for slot_name in slot_names}
+
+        raw_messages: Dict[str, List] = {}
+        current = None
+        with open(proto_file) as proto_handle:
+            for line in proto_handle:
+                message_match = MESSAGE_RE.match(line)
+                if message_match:
+                    current = raw_messages.setdefault(message_match.group(1), [])
+                    continue
+                field_match = FIELD_RE.match(line)
+                if field_match and current is not None:
+                    current.append(field_match.groups())
+
+        message_by_type = {name[0].lower() + name[1:]: name for name in raw_messages}
+        messages = {}
+        for message_name, raw_fields in raw_messages.items():
+            fields = []
+            for position, (repeated, field_type, field_name, number) in enumerate(raw_fields, start=1):
+                number = int(number) or position
+                message = message_by_type.get(field_type)
+                if message:
+                    kind, wire_type = "message", WIRE_LENGTH_DELIMITED
+                elif field_type in VARINT_TYPES:
+                    kind, wire_type = VARINT_TYPES[field_type], WIRE_VARINT
+                elif field_type in ("float", "double"):
+                    # float slots are carried as doubles too, since float32 would change most values
+                    kind, wire_type = "double", WIRE_FIXED64
+                elif field_type in STRING_TYPES or ENUM_TYPE_RE.match(field_type):
+                    # the enum types, e.g. nEGCONTTYPEENUM, are referenced but never defined
+                    kind, wire_type = "string", WIRE_LENGTH_DELIMITED
+                else:
+                    # a class the generator didn't emit a message for, e.g. the MigsBa mixin
+                    kind, wire_type = "missing", WIRE_LENGTH_DELIMITED
+                fields.append(ProtoField(
+                    number=number,
+                    name=field_name,
+                    slot=slot_by_field_name.get(field_name, field_name),
+                    kind=kind,
+                    repeated=bool(repeated),
+                    message=message,
+                    tag=encode_varint(number << 3 | wire_type),
+                ))
+            messages[message_name] = fields
+        return cls(messages)
+
+    # -- encoding ----------------------------------------------------------------------------------
+
+    def encode_value(self, message_name: str, proto_field: ProtoField, value: Any, out: bytearray):
+        kind = proto_field.kind
+        if kind in ("integer", "double") and not isinstance(value, bool):
+            try:
+                number = int(value) if kind == "integer" else float(value)
+            except (TypeError, ValueError):
+                number = None
+            if number is None or (kind == "integer" and isinstance(value, float) and number != value):
+                raise ValueError(f"{message_name}.{proto_field.slot}: can't encode {value!r} as {kind}")
+            value = number
+        out += proto_field.tag
+        if kind == "string":
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            encoded = str(value).encode("utf-8")
+            out += encode_varint(len(encoded))
+            out += encoded
+        elif kind == "message":
+            encoded = self.encode_message(proto_field.message, value)
+            out += encode_varint(len(encoded))
+            out += encoded
+        elif kind == "integer":
+            out += encode_varint(int(value))
+        elif kind == "boolean":
+            if isinstance(value, str):
+                value = value.strip().lower() in ("true", "1", "yes")
+            out += encode_varint(1 if value else 0)
+        else:
+            out += FLOAT64.pack(float(value))
+
+    def encode_message(self, message_name: str, data: Dict[str, Any]) -> bytes:
+        fields = self.by_slot[message_name]
+        out = bytearray()
+        for slot_name, value in data.items():
+            if value is None:
+                continue
+            proto_field = fields.get(slot_name)
+            if proto_field is None:
+                raise ValueError(f"{message_name} has no field for slot {slot_name}")
+            if proto_field.kind == "missing":
+                raise ValueError(f"{message_name}.{proto_field.name} refers to a message the .proto doesn't define")
+            if isinstance(value, list):
+                if not proto_field.repeated:
+                    raise ValueError(f"{message_name}.{slot_name} takes a single value, got a list")
+                for item in value:
+                    self.encode_value(message_name, proto_field, item, out)
+            elif proto_field.kind == "string" and type(value) is str:
+                # the overwhelmingly common case, inlined
+                encoded = value.encode("utf-8")
+                size = len(encoded)
+                out += proto_field.tag
+                out += bytes((size,)) if size < 0x80 else encode_varint(size)
+                out += encoded
+            else:
+                self.encode_value(message_name, proto_field, value, out)
+        return bytes(out)
+
+    # -- decoding ----------------------------------------------------------------------------------
+
+    def decode_scalar(self, proto_field: ProtoField, wire_type: int, buf: bytes, pos: int):
+        if wire_type == WIRE_VARINT:
+            value, pos = decode_varint(buf, pos)
+            return (bool(value) if proto_field.kind == "boolean" else signed64(value)), pos
+        if wire_type == WIRE_FIXED32:
+            # only from other writers; this codec writes float slots as doubles
+            return FLOAT32.unpack_from(buf, pos)[0], pos + 4
+        if wire_type == WIRE_FIXED64:
+            return FLOAT64.unpack_from(buf, pos)[0], pos + 8
+        length, pos = decode_varint(buf, pos)
+        end = pos + length
+        if proto_field.kind == "message":
+            return self.decode_message(proto_field.message, buf[pos:end]), end
+        return buf[pos:end].decode("utf-8"), end
+
+    def decode_message(self, message_name: str, buf: bytes) -> Dict[str, Any]:
+        fields = self.by_number[message_name]
+        data: Dict[str, Any] = {}
+        pos = 0
+        length = len(buf)
+        while pos < length:
+            key = buf[pos]
+            if key < 0x80:
+                pos += 1
+            else:
+                key, pos = decode_varint(buf, pos)
+            number, wire_type = key >> 3, key & 0x7
+            proto_field = fields.get(number)
+            if proto_field is None or proto_field.kind == "missing":
+                pos = skip_field(wire_type, buf, pos)
+                continue
+
+            if wire_type == WIRE_LENGTH_DELIMITED and proto_field.kind == "string":
+                # the overwhelmingly common case, inlined
+                size = buf[pos]
+                if size < 0x80:
+                    pos += 1
+                else:
+                    size, pos = decode_varint(buf, pos)
+                value = buf[pos:pos + size].decode("utf-8")
+                pos += size
+            elif (wire_type == WIRE_LENGTH_DELIMITED and proto_field.repeated
+                  and proto_field.kind != "message"):
+                # packed repeated scalars, as proto3 writers emit them
+                packed_length, pos = decode_varint(buf, pos)
+                end = pos + packed_length
+                scalar_wire_type = WIRE_FIXED64 if proto_field.kind == "double" else WIRE_VARINT
+                values = data.setdefault(proto_field.slot, [])
+                while pos < end:
+                    value, pos = self.decode_scalar(proto_field, scalar_wire_type, buf, pos)
+                    values.append(value)
+                continue
+            else:
+                value, pos = self.decode_scalar(proto_field, wire_type, buf, pos)
+
+            if proto_field.repeated:
+                data.setdefault(proto_field.slot, []).append(value)
+            else:
+                data[proto_field.slot] = value
+        return data
+
+
+def skip_field(wire_type: int, buf: bytes, pos: int) -> int:
+    if wire_type == WIRE_VARINT:
+        return decode_varint(buf, pos)[1]
+    if wire_type == WIRE_FIXED64:
+        return pos + 8
+    if wire_type == WIRE_FIXED32:
+        return pos + 4
+    if wire_type == WIRE_LENGTH_DELIMITED:
+        length, pos = decode_varint(buf, pos)
+        return pos + length
+    raise ValueError(f"unsupported wire type {wire_type}")
+
+
+class MixsProtobufWriter:
+    """Writes MixsCompliantData batches to a binary stream, each prefixed with its varint length."""
+
+    def __init__(self, proto_schema: ProtoSchema, stream: BinaryIO):
+        self.proto_schema = proto_schema
+        self.stream = stream
+        self.messages = 0
+
+    def write(self, batch: Dict[str, List[Dict[str, Any]]]):
+        encoded = self.proto_schema.encode_message(CONTAINER_MESSAGE, batch)
+        self.stream.write(encode_varint(len(encoded)))
+        self.stream.write(encoded)
+        self.messages += 1
+
+    def write_records(self, container_slot: str, records: Iterable[Dict[str, Any]], batch_size: int = 1000):
+        """Writes a (possibly unbounded) iterable of records as batches of at most batch_size."""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self.write({container_slot: batch})
+                batch = []
+        if batch:
+            self.write({container_slot: batch})
+
+
+class MixsProtobufReader:
+    """Iterates over the length-delimited MixsCompliantData batches in a binary stream."""
+
+    def __init__(self, proto_schema: ProtoSchema, stream: BinaryIO):
+        self.proto_schema = proto_schema
+        self.stream = stream
+
+    def read_length(self) -> Optional[int]:
+        result = 0
+        shift = 0
+        while True:
+            byte = self.stream.read(1)
+            if not byte:
+                if shift:
+                    raise EOFError("stream ended inside a length prefix")
+                return None
+            result |= (byte[0] & 0x7F) << shift
+            if not byte[0] & 0x80:
+                return result
+            shift += 7
+
+    def __iter__(self) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+        while True:
+            length = self.read_length()
+            if length is None:
+                return
+            buf = self.stream.read(length)
+            if len(buf) != length:
+                raise EOFError("stream ended inside a message")
+            yield self.proto_schema.decode_message(CONTAINER_MESSAGE, buf)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Flattens the batches into (container_slot, record) pairs."""
+        for batch in self:
+            for container_slot, records in batch.items():
+                for record in records:
+                    yield container_slot, record
+
+
+def load_proto_schema(schema: str, proto: str) -> ProtoSchema:
+    return ProtoSchema.from_proto_file(proto, SchemaView(schema).all_slots().keys())
+
+
+@click.group()
+def protobuf_codec():
+    """Converts MixsCompliantData between YAML/JSON and length-delimited protobuf."""
+
+
+@protobuf_codec.command()
+@click.option('--schema', '-s', default='src/mixs/schema/mixs.yaml', required=True, help='Path to the schema file')
+@click.option('--proto', default='project/protobuf/mixs.proto', required=True, help='Path to the generated .proto file')
+@click.option('--input', '-i', 'input_file', type=click.File('r'), required=True,
+              help='MixsCompliantData YAML or JSON file')
+@click.option('--output', '-o', type=click.File('wb'), required=True, help='Protobuf output file')
+@click.option('--batch-size', default=1000, type=int, help='Records per delimited message (default: 1000)')
+def encode(schema, proto, input_file, output, batch_size):
+    proto_schema = load_proto_schema(schema, proto)
+    document = yaml.safe_load(input_file)
+    writer = MixsProtobufWriter(proto_schema, output)
+    for container_slot, records in document.items():
+        writer.write_records(container_slot, records or [], batch_size)
+    click.echo(f"Wrote {writer.messages} messages", err=True)
+
+
+@protobuf_codec.command()
+@click.option('--schema', '-s', default='src/mixs/schema/mixs.yaml', required=True, help='Path to the schema file')
+@click.option('--proto', default='project/protobuf/mixs.proto', required=True, help='Path to the generated .proto file')
+@click.option('--input', '-i', 'input_file', type=click.File('rb'), required=True, help='Protobuf input file')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='JSON output file (default: stdout)')
+def decode(schema, proto, input_file, output):
+    proto_schema = load_proto_schema(schema, proto)
+    document: Dict[str, List[Dict[str, Any]]] = {}
+    for container_slot, record in MixsProtobufReader(proto_schema, input_file).records():
+        document.setdefault(container_slot, []).append(record)
+    json.dump(document, output, indent=2)
+    output.write("\n")
+
+
+if __name__ == '__main__':
+    protobuf_codec()
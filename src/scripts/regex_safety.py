@@ -0,0 +1,650 @@
+import logging
+import math
+import multiprocessing
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import click
+import yaml
+from linkml_runtime import SchemaView
+
+from scripts.compiled_schema import materialize_pattern
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+logger = logging.getLogger(__name__)
+
+MAXREPEAT = sre_constants.MAXREPEAT
+
+# bounded repeats longer than this are treated like unbounded ones
+LARGE_REPEAT = 32
+
+# characters used to approximate what a regex node can consume
+ALPHABET = [chr(i) for i in range(32, 127)] + ["\t", "\n", "\u00e9", "\u00a0"]
+PREFERRED_CHARS = "a0A_.:;/ -!\t\n"
+
+SUFFIX_CANDIDATES = ["!", "-", " ", "\n", "\x00", " -", "\n!"]
+
+# pumps tried on patterns the static analysis passes, to catch multi-character ambiguity like
+# the dot-separated host part of the URL pattern
+GENERIC_PUMPS = ["a", "0", "a.", "0 ", "a-"]
+
+# a generic probe counts as super-linear when its fitted growth exponent reaches this and its
+# slowest search took long enough for the fit not to be timer noise
+SUPERLINEAR_EXPONENT = 1.5
+SUPERLINEAR_MIN_SECONDS = 0.001
+
+CATEGORY_REGEXES = {
+    sre_constants.CATEGORY_DIGIT: re.compile(r"\d"),
+    sre_constants.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    sre_constants.CATEGORY_SPACE: re.compile(r"\s"),
+    sre_constants.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    sre_constants.CATEGORY_WORD: re.compile(r"\w"),
+    sre_constants.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+
+REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+
+
+@dataclass
+class Finding:
+    """One construct that can make the backtracking engine super-linear."""
+    kind: str
+    degree: Optional[int]
+    detail: str
+    prefix: str
+    pump: str
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "degree": self.degree,
+            "detail": self.detail,
+            "attack_prefix": self.prefix,
+            "attack_pump": self.pump,
+        }
+
+
+@dataclass
+class PatternReport:
+    pattern: str
+    sources: List[str] = field(default_factory=list)
+    findings: List[Finding] = field(default_factory=list)
+    benchmark: Optional[Dict] = None
+
+    @property
+    def safe(self) -> bool:
+        return not self.findings
+
+
+def single_char_set(op, av) -> Optional[Set[str]]:
+    """The subset of ALPHABET a single-character node matches, or None if it isn't one."""
+    if op == sre_constants.LITERAL:
+        return {chr(av)}
+    if op == sre_constants.NOT_LITERAL:
+        return {c for c in ALPHABET if c != chr(av)}
+    if op == sre_constants.ANY:
+        return {c for c in ALPHABET if c != "\n"}
+    if op == sre_constants.IN:
+        negate = False
+        matched: Set[str] = set()
+        for item_op, item_av in av:
+            if item_op == sre_constants.NEGATE:
+                negate = True
+            elif item_op == sre_constants.LITERAL:
+                matched.add(chr(item_av))
+            elif item_op == sre_constants.RANGE:
+                matched.update(c for c in ALPHABET if item_av[0] <= ord(c) <= item_av[1])
+            elif item_op == sre_constants.CATEGORY:
+                matched.update(c for c in ALPHABET if CATEGORY_REGEXES[item_av].match(c))
+        return set(ALPHABET) - matched if negate else matched
+    return None
+
+
+def pick_char(chars: Set[str]) -> str:
+    for c in PREFERRED_CHARS:
+        if c in chars:
+            return c
+    return sorted(chars)[0]
+
+
+class PatternAnalyzer:
+    """
+    Static check of one regular expression for the constructs that make Python's backtracking
+    engine super-linear on non-matching input:
+
+    - nested_quantifier: an unbounded repeat whose body can itself match a run of the same
+      characters in more than one way, e.g. (a+)+ or (a|a)*. Exponential.
+    - overlapping_repeats: a chain of unbounded repeats that are separated only by optional items
+      and whose character sets overlap, e.g. [^\\s-]+.+[^\\s-]+. Polynomial, with the chain length
+      as the degree (one more when the pattern is not anchored, since search retries every offset).
+    - overlapping_groups: such a chain that runs across groups and the separators between them,
+      because every repeat in it can consume the separators too, e.g. ({unit});({unit});({unit}).
+      The splits multiply with every group, so no degree is claimed.
+
+    Character classes are approximated over a small ALPHABET, which is plenty for the ASCII-centric
+    MIxS patterns. Each finding carries a prefix and a pump character from which worst-case inputs
+    are built.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.parsed = sre_parse.parse(pattern)
+        self.findings: List[Finding] = []
+
+    def analyze(self) -> List[Finding]:
+        self.walk_sequence(list(self.parsed.data), "", anchored=False, tail_fails=False)
+        return self.findings
+
+    def generic_probes(self) -> List[Finding]:
+        """Candidate worst-case inputs for a pattern with no static findings, to be benchmarked."""
+        items = list(self.parsed.data)
+        leading = 0
+        while leading < len(items) and not self.unbounded(items[leading:leading + 1]):
+            leading += 1
+        prefix = self.example(items[:leading])
+        return [Finding(kind="measured_superlinear", degree=None, detail=f"generic probe pumping {pump!r}",
+                        prefix=prefix, pump=pump) for pump in GENERIC_PUMPS]
+
+    # -- node properties ---------------------------------------------------------------------------
+
+    def chars(self, items) -> Set[str]:
+        """All characters a sequence of nodes can consume."""
+        consumed: Set[str] = set()
+        for op, av in items:
+            as_single = single_char_set(op, av)
+            if as_single is not None:
+                consumed |= as_single
+            elif op in REPEAT_OPS:
+                consumed |= self.chars(av[2])
+            elif op == sre_constants.SUBPATTERN:
+                consumed |= self.chars(av[-1])
+            elif op == sre_constants.BRANCH:
+                for alternative in av[1]:
+                    consumed |= self.chars(alternative)
+        return consumed
+
+    def nullable(self, items) -> bool:
+        for op, av in items:
+            if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                continue
+            if op in REPEAT_OPS:
+                if av[0] > 0 and not self.nullable(av[2]):
+                    return False
+            elif op == sre_constants.SUBPATTERN:
+                if not self.nullable(av[-1]):
+                    return False
+            elif op == sre_constants.BRANCH:
+                if not any(self.nullable(alternative) for alternative in av[1]):
+                    return False
+            else:
+                return False
+        return True
+
+    def can_fail(self, items) -> bool:
+        """Whether anything in a sequence can reject the input, forcing earlier repeats to backtrack."""
+        for op, av in items:
+            if op == sre_constants.AT and av in (sre_constants.AT_END, sre_constants.AT_END_STRING):
+                return True
+            if not self.nullable([(op, av)]):
+                return True
+        return False
+
+    def unbounded(self, items) -> bool:
+        """Whether a sequence contains a repeat that can consume an arbitrarily long run."""
+        for op, av in items:
+            if op in REPEAT_OPS:
+                if av[1] == MAXREPEAT or av[1] > LARGE_REPEAT or self.unbounded(av[2]):
+                    return True
+            elif op == sre_constants.SUBPATTERN:
+                if self.unbounded(av[-1]):
+                    return True
+            elif op == sre_constants.BRANCH:
+                if any(self.unbounded(alternative) for alternative in av[1]):
+                    return True
+        return False
+
+    def unbounded_chars(self, items) -> Set[str]:
+        """The characters a sequence's unbounded repeats can consume."""
+        consumed: Set[str] = set()
+        for op, av in items:
+            if op in REPEAT_OPS:
+                if av[1] == MAXREPEAT or av[1] > LARGE_REPEAT:
+                    consumed |= self.chars(av[2])
+                else:
+                    consumed |= self.unbounded_chars(av[2])
+            elif op == sre_constants.SUBPATTERN:
+                consumed |= self.unbounded_chars(av[-1])
+            elif op == sre_constants.BRANCH:
+                for alternative in av[1]:
+                    consumed |= self.unbounded_chars(alternative)
+        return consumed
+
+    def example(self, items) -> str:
+        """A short string matching a sequence of nodes, used as the prefix of an attack string."""
+        parts = []
+        for op, av in items:
+            as_single = single_char_set(op, av)
+            if as_single is not None:
+                parts.append(pick_char(as_single) if as_single else "")
+            elif op in REPEAT_OPS:
+                parts.append(self.example(av[2]) * av[0])
+            elif op == sre_constants.SUBPATTERN:
+                parts.append(self.example(av[-1]))
+            elif op == sre_constants.BRANCH:
+                parts.append(self.example(av[1][0]))
+        return "".join(parts)
+
+    # -- detection ---------------------------------------------------------------------------------
+
+    def walk_sequence(self, items, prefix: str, anchored: bool, tail_fails: bool):
+        """
+        Looks for overlapping repeat chains in one sequence and recurses into its groups.
+
+        anchored says whether match attempts can only start at one offset, tail_fails whether
+        something after this sequence can still reject the input.
+        """
+        anchored = anchored or (bool(items) and items[0] == (sre_constants.AT, sre_constants.AT_BEGINNING))
+        chain: List[Set[str]] = []
+        chain_start = 0
+        # the findings recorded while walking each group, by item index
+        group_findings: Dict[int, Tuple[int, int]] = {}
+        for index, (op, av) in enumerate(items):
+            item_prefix = prefix + self.example(items[:index])
+            item_tail_fails = tail_fails or self.can_fail(items[index + 1:])
+
+            if op in REPEAT_OPS:
+                body = list(av[2])
+                is_unbounded = av[1] == MAXREPEAT or av[1] > LARGE_REPEAT
+                if is_unbounded:
+                    if item_tail_fails:
+                        self.check_nested(body, item_prefix)
+                    body_chars = self.chars(body)
+                    overlap = (set.intersection(*chain, body_chars) if chain else set())
+                    if overlap:
+                        chain.append(body_chars)
+                    else:
+                        self.report_chain(chain, items, chain_start, index, prefix, anchored, tail_fails)
+                        chain, chain_start = [body_chars], index
+                    continue
+                self.walk_sequence(body, item_prefix, anchored, item_tail_fails)
+                if self.nullable([(op, av)]):
+                    continue
+            elif op == sre_constants.SUBPATTERN:
+                first_finding = len(self.findings)
+                self.walk_sequence(list(av[-1]), item_prefix, anchored, item_tail_fails)
+                group_findings[index] = (first_finding, len(self.findings))
+                if self.nullable(av[-1]) and not self.unbounded(av[-1]):
+                    continue
+            elif op == sre_constants.BRANCH:
+                first_finding = len(self.findings)
+                for alternative in av[1]:
+                    self.walk_sequence(list(alternative), item_prefix, anchored, item_tail_fails)
+                group_findings[index] = (first_finding, len(self.findings))
+            elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT) \
+                    and av != sre_constants.AT_END:
+                continue
+
+            self.report_chain(chain, items, chain_start, index, prefix, anchored, tail_fails)
+            chain = []
+        self.report_chain(chain, items, chain_start, len(items), prefix, anchored, tail_fails)
+        self.check_groups(items, prefix, tail_fails, group_findings)
+
+    def report_chain(self, chain: List[Set[str]], items, chain_start: int, chain_end: int, prefix: str,
+                     anchored: bool, tail_fails: bool):
+        if len(chain) < 2 or not (tail_fails or self.can_fail(items[chain_end:])):
+            return
+        overlap = set.intersection(*chain)
+        degree = len(chain) + (0 if anchored else 1)
+        self.findings.append(Finding(
+            kind="overlapping_repeats",
+            degree=degree,
+            detail=f"{len(chain)} adjacent unbounded repeats can all consume {pick_char(overlap)!r}",
+            prefix=prefix + self.example(items[:chain_start]),
+            pump=pick_char(overlap),
+        ))
+
+    def check_groups(self, items, prefix: str, tail_fails: bool, group_findings: Dict[int, Tuple[int, int]]):
+        """
+        Looks for unbounded items, at least one of them a group, chained across separators, where
+        every character in the chain, separators included, can be consumed by the unbounded repeats
+        of every item, e.g. ({unit});({unit}) with the termLabel/unit setting. Each repeat can then
+        swallow its neighbours' separators and values, so the ways to split a failing input multiply
+        with every group. The overlapping_repeats degree found inside those groups only describes
+        one group on its own, so it is dropped in favour of one finding without a degree.
+        """
+        span: List[int] = []
+        overlap: Set[str] = set()
+        span_chars: Set[str] = set()
+        superseded: Set[int] = set()
+        for index, (op, av) in enumerate(items + [(None, None)]):
+            if op is not None and self.unbounded([(op, av)]):
+                item_chars = self.chars([(op, av)])
+                item_overlap = self.unbounded_chars([(op, av)])
+                if span and span_chars | item_chars <= overlap & item_overlap:
+                    span.append(index)
+                    overlap &= item_overlap
+                    span_chars |= item_chars
+                    continue
+                superseded |= self.report_groups(span, overlap, items, prefix, tail_fails, group_findings)
+                span, overlap, span_chars = ([index], item_overlap, item_chars) if item_chars <= item_overlap \
+                    else ([], set(), set())
+                continue
+            if op is not None and span:
+                if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT) \
+                        and av != sre_constants.AT_END:
+                    continue
+                item_chars = self.chars([(op, av)])
+                if item_chars and item_chars <= overlap:
+                    span_chars |= item_chars
+                    continue
+                if self.nullable([(op, av)]):
+                    continue
+            superseded |= self.report_groups(span, overlap, items, prefix, tail_fails, group_findings)
+            span, overlap, span_chars = [], set(), set()
+        if superseded:
+            self.findings = [finding for position, finding in enumerate(self.findings) if position not in superseded]
+
+    def report_groups(self, span: List[int], overlap: Set[str], items, prefix: str, tail_fails: bool,
+                      group_findings: Dict[int, Tuple[int, int]]) -> Set[int]:
+        """Records a finding for a chain from check_groups, returning the positions of the findings it replaces."""
+        groups = [index for index in span if items[index][0] in (sre_constants.SUBPATTERN, sre_constants.BRANCH)]
+        if len(span) < 2 or not groups or not (tail_fails or self.can_fail(items[span[-1] + 1:])):
+            return set()
+        superseded = {position for index in groups for position in range(*group_findings.get(index, (0, 0)))
+                      if self.findings[position].kind == "overlapping_repeats"}
+        self.findings.append(Finding(
+            kind="overlapping_groups",
+            degree=None,
+            detail=f"{len(span)} unbounded items, {len(groups)} of them groups, can all consume "
+                   f"{pick_char(overlap)!r}, including the separators between them",
+            prefix=prefix + self.example(items[:span[0]]),
+            pump=self.example(items[span[0]:span[1]]),
+        ))
+        return superseded
+
+    def check_nested(self, body, prefix: str):
+        """Flags an unbounded repeat whose body is itself ambiguous over a run of characters."""
+        ambiguous = None
+        if self.nullable(body):
+            ambiguous = "a repeated body that can match the empty string"
+        elif self.unbounded(body):
+            ambiguous = "an unbounded repeat nested in another unbounded repeat"
+        elif len(body) == 1 and body[0][0] == sre_constants.BRANCH:
+            alternatives = body[0][1][1]
+            for i, left in enumerate(alternatives):
+                for right in alternatives[i + 1:]:
+                    if self.chars(left[:1]) & self.chars(right[:1]):
+                        ambiguous = "a repeated alternation whose branches can start with the same character"
+        if body and body[0][0] == sre_constants.SUBPATTERN and len(body) == 1:
+            self.check_nested(list(body[0][1][-1]), prefix)
+            return
+        if ambiguous:
+            pump_chars = self.chars(body) or set(ALPHABET)
+            self.findings.append(Finding(
+                kind="nested_quantifier",
+                degree=None,
+                detail=ambiguous,
+                prefix=prefix,
+                pump=self.example(body) or pick_char(pump_chars),
+            ))
+
+
+def analyze_pattern(pattern: str) -> List[Finding]:
+    return PatternAnalyzer(pattern).analyze()
+
+
+def collect_patterns(schema_file: str) -> Dict[str, PatternReport]:
+    """
+    Gathers every pattern in the schema, both as written and as materialized from an interpolated
+    structured_pattern, for slots and for class slot_usage, keyed by the pattern text.
+    """
+    schema_view = SchemaView(schema_file)
+    settings = {k: v.setting_value for k, v in (schema_view.schema.settings or {}).items()}
+    reports: Dict[str, PatternReport] = {}
+
+    def add(pattern: Optional[str], source: str):
+        if not pattern:
+            return
+        pattern = str(pattern)
+        reports.setdefault(pattern, PatternReport(pattern=pattern)).sources.append(source)
+
+    def add_slot(slot_obj, source: str):
+        add(slot_obj.pattern, f"{source} pattern")
+        if slot_obj.structured_pattern and slot_obj.structured_pattern.syntax \
+                and slot_obj.structured_pattern.interpolated:
+            add(materialize_pattern(slot_obj.structured_pattern.syntax, settings),
+                f"{source} structured_pattern")
+
+    for slot_name, slot_obj in schema_view.all_slots().items():
+        add_slot(slot_obj, slot_name)
+    for class_name, class_obj in schema_view.all_classes().items():
+        for slot_name, slot_usage in (class_obj.slot_usage or {}).items():
+            add_slot(slot_usage, f"{class_name}.{slot_name}")
+    for setting_name, setting_value in settings.items():
+        add(setting_value, f"settings.{setting_name}")
+    return reports
+
+
+def _match_worker(connection):
+    compiled_patterns: Dict[str, re.Pattern] = {}
+    while True:
+        try:
+            pattern, value = connection.recv()
+        except EOFError:
+            return
+        if pattern not in compiled_patterns:
+            compiled_patterns[pattern] = re.compile(pattern)
+        start = time.perf_counter()
+        matched = compiled_patterns[pattern].search(value) is not None
+        connection.send((matched, time.perf_counter() - start))
+
+
+class BudgetedMatcher:
+    """
+    Runs searches in a worker process and abandons any that exceed budget_ms, killing and
+    replacing the worker, since Python's re cannot be interrupted from another thread.
+    """
+
+    def __init__(self, budget_ms: float):
+        self.budget = budget_ms / 1000.0
+        self.lock = threading.Lock()
+        self.connection = None
+        self.process = None
+
+    def start_worker(self):
+        self.connection, worker_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_match_worker, args=(worker_end,), daemon=True)
+        self.process.start()
+
+    def timed_search(self, pattern: str, value: str) -> Tuple[bool, float]:
+        """Returns whether value matched and how long the search took inside the worker."""
+        with self.lock:
+            if self.process is None or not self.process.is_alive():
+                self.start_worker()
+            self.connection.send((pattern, value))
+            if self.connection.poll(self.budget):
+                return self.connection.recv()
+            self.process.kill()
+            self.process.join()
+            self.process = None
+            raise TimeoutError(f"matching a {len(value)} character value exceeded {self.budget * 1000:g} ms")
+
+    def search(self, pattern: str, value: str) -> bool:
+        return self.timed_search(pattern, value)[0]
+
+
+class BudgetedPattern:
+    """
+    A re.Pattern stand-in for patterns the analyzer flagged. Every search goes to the
+    BudgetedMatcher: a flagged pattern can already take seconds on a few dozen characters, so no
+    length is short enough to match in-process without the budget.
+    """
+
+    def __init__(self, pattern: str, matcher: BudgetedMatcher):
+        self.pattern = pattern
+        self.matcher = matcher
+
+    def search(self, value: str):
+        return True if self.matcher.search(self.pattern, value) else None
+
+
+def benchmark_pattern(pattern: str, findings: List[Finding], lengths: List[int], matcher: BudgetedMatcher
+                      ) -> Dict:
+    """
+    Times searches on worst-case inputs built from each finding: prefix + pump * n + a suffix that
+    forces failure. The suffix is the slowest of SUFFIX_CANDIDATES at the shortest length. Searches
+    run in the matcher's worker, so an input that blows the budget is recorded as null instead of
+    hanging the benchmark, and longer inputs are skipped. Growth is the exponent fitted between the
+    two longest inputs that finished.
+    """
+    results = []
+    for finding in findings:
+        def attack(length: int, suffix: str) -> Optional[float]:
+            try:
+                return matcher.timed_search(pattern, finding.prefix + finding.pump * length + suffix)[1]
+            except TimeoutError:
+                return None
+
+        suffix = max(SUFFIX_CANDIDATES, key=lambda s: attack(lengths[0], s) or float("inf"))
+        timings: Dict[int, Optional[float]] = {}
+        for length in lengths:
+            elapsed = attack(length, suffix)
+            timings[length] = round(elapsed, 6) if elapsed is not None else None
+            if elapsed is None:
+                break
+        finished = [(n, t) for n, t in timings.items() if t is not None]
+        exponent = None
+        if len(finished) >= 2 and finished[-2][1] > 0:
+            (n1, t1), (n2, t2) = finished[-2], finished[-1]
+            exponent = round(math.log(max(t2, 1e-9) / t1) / math.log(n2 / n1), 2)
+        results.append({
+            "kind": finding.kind,
+            "suffix": suffix,
+            "seconds_by_length": timings,
+            "growth_exponent": exponent,
+            "exceeded_budget": None in timings.values(),
+        })
+    finished_times = [t for r in results for t in r["seconds_by_length"].values() if t is not None]
+    return {
+        "exceeded_budget": any(r["exceeded_budget"] for r in results),
+        "worst_seconds": max(finished_times, default=0.0),
+        "inputs": results,
+    }
+
+
+def pattern_compiler(backend: str, budget_ms: float = 50.0) -> Callable[[str], object]:
+    """
+    Returns a compile function for CompiledSchema.compile_patterns:
+
+    - re: Python's backtracking engine for every pattern
+    - re2: the linear-time RE2 engine (needs the optional google-re2 package), falling back to re
+      for the few patterns RE2 rejects
+    - budget: re for patterns the analyzer considers safe, BudgetedPattern for the rest
+    """
+    if backend == "re":
+        return re.compile
+    if backend == "re2":
+        if re2 is None:
+            raise click.ClickException("the re2 backend needs the google-re2 package")
+
+        def compile_re2(pattern: str):
+            try:
+                return re2.compile(pattern)
+            except Exception:
+                logger.warning(f"RE2 cannot compile {pattern!r}, using re")
+                return re.compile(pattern)
+
+        return compile_re2
+    if backend == "budget":
+        matcher = BudgetedMatcher(budget_ms)
+
+        def compile_budgeted(pattern: str):
+            if analyze_pattern(pattern):
+                return BudgetedPattern(pattern, matcher)
+            return re.compile(pattern)
+
+        return compile_budgeted
+    raise ValueError(f"unknown regex backend {backend}")
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Where to write the YAML report (default: stdout)')
+@click.option('--benchmark/--no-benchmark', default=False,
+              help='Time worst-case inputs for every flagged pattern')
+@click.option('--lengths', default='64,128,256,512,1024,2048',
+              help='Comma-separated pump lengths for the benchmark')
+@click.option('--budget-ms', default=1000.0, type=float,
+              help='Abandon a benchmark search after this many milliseconds and skip longer inputs')
+@click.option('--include-safe', is_flag=True, default=False, help='Also list patterns with no findings')
+def regex_safety(schema, output, benchmark, lengths, budget_ms, include_safe):
+    """
+    Reports schema patterns that are prone to super-linear backtracking, and the slots using them.
+    """
+    reports = collect_patterns(schema)
+    lengths = [int(length) for length in lengths.split(",")]
+    matcher = BudgetedMatcher(budget_ms)
+
+    entries = []
+    for report in reports.values():
+        analyzer = PatternAnalyzer(report.pattern)
+        report.findings = analyzer.analyze()
+        if benchmark:
+            logger.info(f"Benchmarking {report.pattern}")
+            if report.findings:
+                report.benchmark = benchmark_pattern(report.pattern, report.findings, lengths, matcher)
+            else:
+                probes = analyzer.generic_probes()
+                probe_benchmark = benchmark_pattern(report.pattern, probes, lengths, matcher)
+                for probe, result in zip(probes, probe_benchmark["inputs"]):
+                    slowest = max((t for t in result["seconds_by_length"].values() if t is not None), default=0)
+                    if result["exceeded_budget"] or ((result["growth_exponent"] or 0) >= SUPERLINEAR_EXPONENT
+                                                     and slowest >= SUPERLINEAR_MIN_SECONDS):
+                        probe.degree = round(result["growth_exponent"]) if result["growth_exponent"] else None
+                        report.findings.append(probe)
+                if report.findings:
+                    report.benchmark = probe_benchmark
+        if report.findings or include_safe:
+            entry = {
+                "pattern": report.pattern,
+                "safe": report.safe,
+                "source_count": len(report.sources),
+                "sources": report.sources,
+                "findings": [finding.to_dict() for finding in report.findings],
+            }
+            if report.benchmark:
+                entry["benchmark"] = report.benchmark
+            entries.append(entry)
+
+    entries.sort(key=lambda e: (
+        not (e.get("benchmark") or {}).get("exceeded_budget", False),
+        -(e.get("benchmark") or {}).get("worst_seconds", 0),
+        -e["source_count"],
+    ))
+    summary = {
+        "patterns": len(reports),
+        "flagged_patterns": sum(1 for r in reports.values() if not r.safe),
+        "flagged_sources": sum(len(r.sources) for r in reports.values() if not r.safe),
+    }
+    output.write(yaml.dump({"summary": summary, "patterns": entries}, sort_keys=False, allow_unicode=True))
+
+
+if __name__ == '__main__':
+    regex_safety()
@@ -0,0 +1,384 @@
+import hashlib
+import io
+import json
+import logging
+import lzma
+import os
+import re
+import tarfile
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import click
+import yaml
+
+logger = logging.getLogger(__name__)
+
+RELEASE_BUNDLE_FORMAT = 1
+
+MANIFEST_FILE = "manifest.json"
+
+VERIFY_CACHE_FILE = ".verified.json"
+
+# zip's earliest representable time; used for every member of a normalized workbook
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+CORE_TIMESTAMPS = re.compile(rb"(<dcterms:(?:created|modified)[^>]*>)[^<]*(</dcterms:(?:created|modified)>)")
+
+# only store the compressed form when it saves at least this fraction
+MIN_COMPRESSION_SAVING = 0.1
+
+# gitignored caches the other tools write under project/; they aren't release artifacts
+CACHE_FILES = ["project/mixs-compiled.json", "project/mixs-sample-index.npz", "project/mixs-class-distances.npz"]
+
+
+def normalize_workbook(data: bytes) -> bytes:
+    """
+    Rewrites an .xlsx so that regenerating an unchanged template gives identical bytes: member
+    timestamps are fixed and docProps/core.xml's created/modified stamps are blanked to the epoch.
+    The cell content, styles and member order are untouched.
+    """
+    normalized = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, \
+            zipfile.ZipFile(normalized, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as target:
+        for member in source.infolist():
+            content = source.read(member)
+            if member.filename == "docProps/core.xml":
+                content = CORE_TIMESTAMPS.sub(rb"\g<1>1980-01-01T00:00:00Z\g<2>", content)
+            target_member = zipfile.ZipInfo(member.filename, ZIP_EPOCH)
+            target_member.compress_type = zipfile.ZIP_DEFLATED
+            target_member.external_attr = 0o644 << 16
+            target.writestr(target_member, content, compresslevel=9)
+    return normalized.getvalue()
+
+
+def canonical_bytes(path: str, normalize_workbooks: bool = True) -> bytes:
+    with open(path, "rb") as artifact_handle:
+        data = artifact_handle.read()
+    if normalize_workbooks and path.endswith(".xlsx"):
+        return normalize_workbook(data)
+    return data
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def iter_artifacts(roots: List[str], exclude: Iterable[str] = ()) -> Iterator[str]:
+    """
+    Every file under the roots, as sorted /-separated relative paths. Hidden files and the paths
+    in exclude are skipped.
+    """
+    excluded = {os.path.normpath(path) for path in exclude}
+    for root in roots:
+        if os.path.isfile(root):
+            found = [root]
+        else:
+            found = []
+            for directory, subdirectories, files in os.walk(root):
+                subdirectories[:] = [subdirectory for subdirectory in subdirectories
+                                     if not subdirectory.startswith(".")]
+                found.extend(os.path.join(directory, file) for file in files if not file.startswith("."))
+        yield from sorted(path.replace(os.sep, "/") for path in found if os.path.normpath(path) not in excluded)
+
+
+def blob_path(artifact_hash: str, encoding: str) -> str:
+    return f"blobs/{artifact_hash[:2]}/{artifact_hash}" + (".xz" if encoding == "xz" else "")
+
+
+def read_blob(bundle: str, artifact_hash: str, entry: Dict[str, Any]) -> bytes:
+    with open(os.path.join(bundle, blob_path(artifact_hash, entry["encoding"])), "rb") as blob_handle:
+        stored = blob_handle.read()
+    return lzma.decompress(stored) if entry["encoding"] == "xz" else stored
+
+
+class ReleaseBundle:
+    """
+    A content-addressed release bundle.
+
+    Every artifact under the given roots is hashed (sha256 of its canonical bytes; workbooks are
+    normalized first, see normalize_workbook) and its original bytes are stored once under blobs/,
+    xz-compressed where that helps. manifest.json maps each hash to its size, encoding and the list of paths that
+    have that content. Blob names never change for unchanged content, so a mirror that already
+    has the previous release only needs the blobs whose hashes are new. One deterministic
+    .tar.xz per root is written under archives/ for whole-tree downloads.
+    """
+
+    def __init__(self, bundle: str, manifest: Dict[str, Any]):
+        self.bundle = bundle
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, bundle: str) -> "ReleaseBundle":
+        with open(os.path.join(bundle, MANIFEST_FILE)) as manifest_handle:
+            manifest = json.load(manifest_handle)
+        if manifest.get("format") != RELEASE_BUNDLE_FORMAT:
+            raise click.ClickException(f"{bundle} is not a format {RELEASE_BUNDLE_FORMAT} release bundle")
+        return cls(bundle, manifest)
+
+    @classmethod
+    def build(cls, roots: List[str], bundle: str, version: Optional[str] = None, normalize_workbooks: bool = True,
+              archives: bool = True, exclude: Iterable[str] = tuple(CACHE_FILES)) -> "ReleaseBundle":
+        artifacts: Dict[str, Dict[str, Any]] = {}
+        new_blobs = 0
+        archive_members: Dict[str, List[Tuple[str, str]]] = {root: [] for root in roots}
+
+        for root in roots:
+            for path in iter_artifacts([root], exclude):
+                with open(path, "rb") as artifact_handle:
+                    data = artifact_handle.read()
+                # a workbook is addressed by its normalized form, but stored as released
+                normalized = normalize_workbooks and path.endswith(".xlsx")
+                artifact_hash = content_hash(normalize_workbook(data) if normalized else data)
+                archive_members[root].append((path, artifact_hash))
+                if artifact_hash in artifacts:
+                    artifacts[artifact_hash]["paths"].append(path)
+                    continue
+
+                # an unchanged artifact from an earlier build into the same bundle is already stored
+                existing = [encoding for encoding in ("xz", "identity")
+                            if os.path.isfile(os.path.join(bundle, blob_path(artifact_hash, encoding)))]
+                if existing:
+                    encoding = existing[0]
+                else:
+                    compressed = lzma.compress(data, preset=9)
+                    encoding = "xz" if len(compressed) < len(data) * (1 - MIN_COMPRESSION_SAVING) else "identity"
+                    stored_file = os.path.join(bundle, blob_path(artifact_hash, encoding))
+                    os.makedirs(os.path.dirname(stored_file), exist_ok=True)
+                    with open(stored_file + ".tmp", "wb") as blob_handle:
+                        blob_handle.write(compressed if encoding == "xz" else data)
+                    os.replace(stored_file + ".tmp", stored_file)
+                    new_blobs += 1
+                artifacts[artifact_hash] = {
+                    "size": len(data),
+                    "encoding": encoding,
+                    "stored_size": os.path.getsize(os.path.join(bundle, blob_path(artifact_hash, encoding))),
+                    "paths": [path],
+                }
+                if normalized:
+                    artifacts[artifact_hash]["normalized"] = True
+
+        release_bundle = cls(bundle, {
+            "format": RELEASE_BUNDLE_FORMAT,
+            "version": version,
+            "normalized_workbooks": normalize_workbooks,
+            "artifacts": artifacts,
+            "archives": {},
+        })
+        if archives:
+            for root, members in archive_members.items():
+                release_bundle.write_archive(root, members)
+        release_bundle.save()
+        logger.info(f"{sum(len(entry['paths']) for entry in artifacts.values())} artifacts, {len(artifacts)} unique, "
+                    f"{new_blobs} new blobs in {bundle}")
+        return release_bundle
+
+    def write_archive(self, root: str, members: List[Tuple[str, str]]):
+        """
+        A reproducible .tar.xz of one root: members sorted, with fixed mtimes and owners, made from
+        the stored blobs, so unchanged content gives a byte-identical archive.
+        """
+        name = "archives/" + os.path.basename(os.path.normpath(root)) + ".tar.xz"
+        archive_file = os.path.join(self.bundle, name)
+        os.makedirs(os.path.dirname(archive_file), exist_ok=True)
+        artifacts = self.manifest["artifacts"]
+        with tarfile.open(archive_file + ".tmp", "w:xz", format=tarfile.PAX_FORMAT,
+                          preset=9) as archive:
+            for path, artifact_hash in sorted(members):
+                data = read_blob(self.bundle, artifact_hash, artifacts[artifact_hash])
+                member = tarfile.TarInfo(path)
+                member.size = len(data)
+                member.mode = 0o644
+                member.mtime = 0
+                archive.addfile(member, io.BytesIO(data))
+        os.replace(archive_file + ".tmp", archive_file)
+        with open(archive_file, "rb") as archive_handle:
+            archive_data = archive_handle.read()
+        self.manifest["archives"][name] = {"sha256": content_hash(archive_data), "size": len(archive_data)}
+
+    def save(self):
+        manifest_file = os.path.join(self.bundle, MANIFEST_FILE)
+        with open(manifest_file + ".tmp", "w") as manifest_handle:
+            json.dump(self.manifest, manifest_handle, indent=1, sort_keys=True)
+        os.replace(manifest_file + ".tmp", manifest_file)
+
+    def stored_files(self) -> Dict[str, str]:
+        """Every file a mirror needs, as bundle-relative path -> sha256 of the file's expected content."""
+        stored = {blob_path(artifact_hash, entry["encoding"]): artifact_hash
+                  for artifact_hash, entry in self.manifest["artifacts"].items()}
+        stored.update({name: entry["sha256"] for name, entry in self.manifest["archives"].items()})
+        return stored
+
+    def delta(self, since: "ReleaseBundle", archives: bool = False) -> List[str]:
+        """
+        The files a mirror of since has to fetch to serve this bundle: the new blobs and the
+        manifest, plus the changed archives if archives is set.
+        """
+        already_synced = since.stored_files()
+        return [name for name, file_hash in sorted(self.stored_files().items())
+                if already_synced.get(name) != file_hash
+                and (archives or not name.startswith("archives/"))] + [MANIFEST_FILE]
+
+    def verify(self, since: Optional["ReleaseBundle"] = None, full: bool = False,
+               tree: Optional[str] = None) -> List[str]:
+        """
+        Checks stored blobs and archives against their hashes and returns the problems found.
+
+        Files whose size and mtime match a previous successful check are trusted, unless full is
+        set, and with since only the blobs that are new relative to that bundle's manifest are
+        looked at. With tree, the artifact paths under that directory are checked too.
+        """
+        cache_file = os.path.join(self.bundle, VERIFY_CACHE_FILE)
+        cache: Dict[str, List[Any]] = {}
+        if not full and os.path.isfile(cache_file):
+            with open(cache_file) as cache_handle:
+                cache = json.load(cache_handle)
+
+        expected = self.stored_files()
+        if since is not None:
+            already_synced = since.stored_files()
+            expected = {name: file_hash for name, file_hash in expected.items()
+                        if already_synced.get(name) != file_hash}
+
+        normalized_blobs = {blob_path(artifact_hash, entry["encoding"])
+                            for artifact_hash, entry in self.manifest["artifacts"].items() if entry.get("normalized")}
+        problems = []
+        checked = 0
+        for name, expected_hash in sorted(expected.items()):
+            file = os.path.join(self.bundle, name)
+            # blobs are addressed by the hash of their content, archives by the hash of the file
+            decompress = name.startswith("blobs/") and name.endswith(".xz")
+            normalize = name in normalized_blobs
+            problem, was_checked = self.check_file(
+                cache, name, file, expected_hash, lambda stored: self.stored_hash(stored, decompress, normalize))
+            checked += was_checked
+            if problem:
+                problems.append(problem)
+
+        if tree is not None:
+            normalize_workbooks = self.manifest.get("normalized_workbooks", True)
+            for artifact_hash, entry in sorted(self.manifest["artifacts"].items()):
+                for path in entry["paths"]:
+                    problem, was_checked = self.check_file(
+                        cache, "tree:" + os.path.abspath(os.path.join(tree, path)), os.path.join(tree, path),
+                        artifact_hash, lambda file: content_hash(canonical_bytes(file, normalize_workbooks)))
+                    checked += was_checked
+                    if problem:
+                        problems.append(problem)
+
+        with open(cache_file, "w") as cache_handle:
+            json.dump(cache, cache_handle)
+        logger.info(f"Hashed {checked} files, {len(problems)} problems")
+        return problems
+
+    @staticmethod
+    def stored_hash(file: str, decompress: bool, normalize: bool = False) -> str:
+        with open(file, "rb") as stored_handle:
+            data = stored_handle.read()
+        try:
+            content = lzma.decompress(data) if decompress else data
+            return content_hash(normalize_workbook(content) if normalize else content)
+        except (lzma.LZMAError, zipfile.BadZipFile):
+            # a damaged blob; the hash of its raw bytes can't match the content hash it is stored under
+            return content_hash(data)
+
+    @staticmethod
+    def check_file(cache: Dict[str, List[Any]], key: str, file: str, expected_hash: str, hasher
+                   ) -> Tuple[Optional[str], bool]:
+        """Returns (problem or None, whether the file had to be hashed)."""
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            cache.pop(key, None)
+            return f"missing: {file}", False
+        signature = [stat.st_size, stat.st_mtime_ns]
+        if cache.get(key) == signature + [expected_hash]:
+            return None, False
+        actual_hash = hasher(file)
+        if actual_hash != expected_hash:
+            cache.pop(key, None)
+            return f"hash mismatch: {file} is {actual_hash}, expected {expected_hash}", True
+        cache[key] = signature + [expected_hash]
+        return None, True
+
+    def unpack(self, destination: str):
+        """Recreates every artifact path under destination from the blobs."""
+        for artifact_hash, entry in self.manifest["artifacts"].items():
+            data = read_blob(self.bundle, artifact_hash, entry)
+            for path in entry["paths"]:
+                target = os.path.join(destination, path)
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                with open(target, "wb") as target_handle:
+                    target_handle.write(data)
+
+
+@click.group()
+def release_bundle():
+    """
+    Builds, verifies and unpacks content-addressed MIxS release bundles.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+
+@release_bundle.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file, for the release version')
+@click.option('--root', '-r', 'roots', multiple=True, default=['project', 'release', 'mixs-templates'],
+              help='Directory or file to bundle; repeatable (default: project, release, mixs-templates)')
+@click.option('--bundle', '-b', default='release-bundle', help='Bundle directory (default: release-bundle)')
+@click.option('--normalize-workbooks/--no-normalize-workbooks', default=True,
+              help='Strip generation timestamps from .xlsx files so unchanged templates keep their hash')
+@click.option('--archives/--no-archives', default=True, help='Also write one .tar.xz per root')
+@click.option('--exclude', '-x', multiple=True, default=CACHE_FILES,
+              help='File to leave out; repeatable (default: the gitignored caches under project/)')
+def build(schema, roots, bundle, normalize_workbooks, archives, exclude):
+    """Hashes the artifacts, stores the new blobs and writes the manifest."""
+    version = None
+    if os.path.isfile(schema):
+        with open(schema) as schema_handle:
+            version = (yaml.safe_load(schema_handle) or {}).get("version")
+    ReleaseBundle.build(list(roots), bundle, version, normalize_workbooks, archives, exclude)
+
+
+@release_bundle.command()
+@click.option('--bundle', '-b', default='release-bundle', help='Bundle directory (default: release-bundle)')
+@click.option('--since', type=click.Path(exists=True),
+              help='Only check what is new relative to this older manifest.json or bundle directory')
+@click.option('--tree', type=click.Path(exists=True, file_okay=False),
+              help='Also check the artifact paths under this checkout')
+@click.option('--full', is_flag=True, default=False, help='Rehash everything, ignoring the verification cache')
+def verify(bundle, since, tree, full):
+    """Checks stored blobs and archives (and optionally a checkout) against the manifest."""
+    since_bundle = None
+    if since is not None:
+        since_bundle = ReleaseBundle.open(since if os.path.isdir(since) else os.path.dirname(since) or ".")
+    problems = ReleaseBundle.open(bundle).verify(since_bundle, full, tree)
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise click.ClickException(f"{len(problems)} problems")
+
+
+@release_bundle.command()
+@click.argument('old', type=click.Path(exists=True, file_okay=False))
+@click.argument('new', type=click.Path(exists=True, file_okay=False))
+@click.option('--archives/--no-archives', default=False,
+              help='Also list changed archives; each is a full download of its root (default: blobs only)')
+def delta(old, new, archives):
+    """Lists the files of bundle NEW that a mirror of bundle OLD has to fetch."""
+    for name in ReleaseBundle.open(new).delta(ReleaseBundle.open(old), archives):
+        click.echo(name)
+
+
+@release_bundle.command()
+@click.option('--bundle', '-b', default='release-bundle', help='Bundle directory (default: release-bundle)')
+@click.argument('destination', type=click.Path(file_okay=False))
+def unpack(bundle, destination):
+    """Recreates the bundled artifacts under DESTINATION."""
+    ReleaseBundle.open(bundle).unpack(destination)
+
+
+if __name__ == '__main__':
+    release_bundle()
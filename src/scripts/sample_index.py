@@ -0,0 +1,489 @@
+import calendar
+import datetime
+import json
+import logging
+import math
+import os
+import re
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import click
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INDEX_FORMAT = 1
+
+EARTH_RADIUS_KM = 6371.0088
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+# collection_date is right-truncatable (2008, 2008-01, 2008-01-23, 2008-01-23T19:23:10+00:00)
+DATE_TIME_STAMP = re.compile(
+    r"^(\d{4})(?:-(\d{2})(?:-(\d{2})(?:T(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?(Z|[+-]\d{2}:\d{2})?)?)?)?$")
+
+# depth and elev follow ^{scientific_float}( *- *{scientific_float})? *{text}$
+MEASUREMENT = re.compile(
+    r"^\s*([-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)(?: *- *([-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?))? *(.*?)\s*$")
+
+METERS_PER_UNIT = {
+    "": 1.0, "m": 1.0, "meter": 1.0, "meters": 1.0, "metre": 1.0, "metres": 1.0,
+    "cm": 0.01, "centimeter": 0.01, "centimeters": 0.01, "centimetre": 0.01, "centimetres": 0.01,
+    "mm": 0.001, "millimeter": 0.001, "millimeters": 0.001,
+    "km": 1000.0, "kilometer": 1000.0, "kilometers": 1000.0, "kilometre": 1000.0, "kilometres": 1000.0,
+    "ft": 0.3048, "foot": 0.3048, "feet": 0.3048,
+}
+
+MISSING_TIME = np.iinfo(np.int64).min
+
+COLUMNS = ["lat", "lon", "time_start", "time_end", "depth_min", "depth_max", "elev_min", "elev_max"]
+
+
+def parse_lat_lon(value: Any) -> Optional[Tuple[float, float]]:
+    """Parses a lat_lon value ("45.1 45.9") into decimal degrees, or None."""
+    parts = str(value).split()
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def parse_collection_date(value: Any) -> Optional[Tuple[int, int]]:
+    """
+    Parses a collection_date into the half-open interval of epoch seconds it covers. A truncated
+    date covers its whole year, month or day; a full time stamp is an instant. Stamps without an
+    offset are taken as UTC. "start/end" intervals are accepted too.
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    elif isinstance(value, datetime.date):
+        value = value.isoformat()
+    text = str(value).strip()
+    if "/" in text:
+        start_text, _, end_text = text.partition("/")
+        start, end = parse_collection_date(start_text), parse_collection_date(end_text)
+        if start is None or end is None or end[1] <= start[0]:
+            return None
+        return start[0], end[1]
+
+    match = DATE_TIME_STAMP.match(text)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, offset = match.groups()
+    try:
+        if month is None:
+            start = datetime.datetime(int(year), 1, 1)
+            end = datetime.datetime(int(year) + 1, 1, 1)
+        elif day is None:
+            start = datetime.datetime(int(year), int(month), 1)
+            end = start + datetime.timedelta(days=calendar.monthrange(int(year), int(month))[1])
+        elif hour is None:
+            start = datetime.datetime(int(year), int(month), int(day))
+            end = start + datetime.timedelta(days=1)
+        else:
+            start = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+            if offset and offset != "Z":
+                sign = -1 if offset[0] == "-" else 1
+                start -= sign * datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+            end = start + datetime.timedelta(seconds=1)
+    except ValueError:
+        return None
+    return calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())
+
+
+def parse_measurement(value: Any) -> Optional[Tuple[float, float]]:
+    """
+    Parses a depth or elev value ("10 meter", "0-5 cm") into a (low, high) interval in meters.
+    Values without a unit are taken to be meters; other units give None.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), float(value)
+    match = MEASUREMENT.match(str(value))
+    if not match:
+        return None
+    low_text, high_text, unit = match.groups()
+    meters = METERS_PER_UNIT.get(unit.lower().rstrip("."))
+    if meters is None:
+        return None
+    low = float(low_text) * meters
+    high = float(high_text) * meters if high_text else low
+    return min(low, high), max(low, high)
+
+
+def read_records(path: str, schema: str, compiled_cache: Optional[str] = None,
+                 proto: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yields (sample id, record) from a MixsCompliantData YAML/JSON document, a JSON lines file of
+    records, a filled-in Excel template or a mixs-protobuf stream. Samples without a samp_name
+    are identified by file and position.
+    """
+    name = os.path.basename(path)
+    if path.endswith(".xlsx"):
+        from scripts.compiled_schema import CompiledSchema
+        from scripts.excel_ingest import TemplateReader
+
+        with TemplateReader(path, CompiledSchema.load(schema, compiled_cache)) as reader:
+            for row_number, record in reader.rows():
+                yield str(record.get("samp_name", f"{name}:{row_number}")), record
+    elif path.endswith(".jsonl"):
+        with open(path) as jsonl_handle:
+            for line_number, line in enumerate(jsonl_handle, start=1):
+                if line.strip():
+                    record = json.loads(line)
+                    yield str(record.get("samp_name", f"{name}:{line_number}")), record
+    elif path.endswith(".pb"):
+        from scripts.protobuf_codec import MixsProtobufReader, load_proto_schema
+
+        with open(path, "rb") as pb_handle:
+            reader = MixsProtobufReader(load_proto_schema(schema, proto), pb_handle)
+            for position, (container_slot, record) in enumerate(reader.records()):
+                yield str(record.get("samp_name", f"{name}:{container_slot}:{position}")), record
+    else:
+        with open(path) as document_handle:
+            document = json.load(document_handle) if path.endswith(".json") else yaml.safe_load(document_handle)
+        for container_slot, records in (document or {}).items():
+            for position, record in enumerate(records or []):
+                yield str(record.get("samp_name", f"{name}:{container_slot}:{position}")), record
+
+
+class SampleIndexBuilder:
+    """
+    Parses lat_lon, collection_date, depth and elev out of records as they stream past, into
+    compact typed arrays. Unparseable or missing values are stored as NaN (or MISSING_TIME) and
+    counted, so they never match a query but don't stop the build.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.columns = {column: array("q" if column.startswith("time_") else "d") for column in COLUMNS}
+        self.unparsed = {"lat_lon": 0, "collection_date": 0, "depth": 0, "elev": 0}
+
+    def add(self, sample_id: str, record: Dict[str, Any]):
+        columns = self.columns
+        self.ids.append(sample_id)
+
+        lat_lon = parse_lat_lon(record["lat_lon"]) if record.get("lat_lon") is not None else None
+        if lat_lon is None and record.get("lat_lon") is not None:
+            self.unparsed["lat_lon"] += 1
+        columns["lat"].append(lat_lon[0] if lat_lon else math.nan)
+        columns["lon"].append(lat_lon[1] if lat_lon else math.nan)
+
+        interval = parse_collection_date(record["collection_date"]) \
+            if record.get("collection_date") is not None else None
+        if interval is None and record.get("collection_date") is not None:
+            self.unparsed["collection_date"] += 1
+        columns["time_start"].append(interval[0] if interval else MISSING_TIME)
+        columns["time_end"].append(interval[1] if interval else MISSING_TIME)
+
+        for slot_name in ("depth", "elev"):
+            measurement = parse_measurement(record[slot_name]) if record.get(slot_name) is not None else None
+            if measurement is None and record.get(slot_name) is not None:
+                self.unparsed[slot_name] += 1
+            columns[f"{slot_name}_min"].append(measurement[0] if measurement else math.nan)
+            columns[f"{slot_name}_max"].append(measurement[1] if measurement else math.nan)
+
+    def add_all(self, records: Iterable[Tuple[str, Dict[str, Any]]]):
+        for sample_id, record in records:
+            self.add(sample_id, record)
+
+    def build(self, cell_degrees: float = 1.0) -> "SampleIndex":
+        return SampleIndex.from_columns(
+            np.array(self.ids, dtype=str),
+            {column: np.frombuffer(values, dtype=np.int64 if values.typecode == "q" else np.float64).copy()
+             for column, values in self.columns.items()},
+            cell_degrees=cell_degrees,
+        )
+
+
+class SampleIndex:
+    """
+    A spatial grid and a time index over parsed sample coordinates.
+
+    The grid is stored CSR-style: sample positions sorted by grid cell id (row-major over
+    cell_degrees-sized lat/lon cells) plus the sorted cell ids, so each grid row of a bounding box
+    is one contiguous slice found by binary search. The time index is the sample positions sorted
+    by interval start; together with the longest interval it bounds the slice that can overlap a
+    date range. Candidates from either are then checked exactly against the typed arrays.
+    """
+
+    def __init__(self, ids: np.ndarray, columns: Dict[str, np.ndarray], cell_degrees: float,
+                 cell_order: np.ndarray, cell_ids: np.ndarray, time_order: np.ndarray, time_starts: np.ndarray,
+                 max_duration: int):
+        self.ids = ids
+        self.columns = columns
+        self.cell_degrees = cell_degrees
+        self.grid_columns = int(math.ceil(360.0 / cell_degrees))
+        self.grid_rows = int(math.ceil(180.0 / cell_degrees))
+        self.cell_order = cell_order
+        self.cell_ids = cell_ids
+        self.time_order = time_order
+        self.time_starts = time_starts
+        self.max_duration = max_duration
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_columns(cls, ids: np.ndarray, columns: Dict[str, np.ndarray], cell_degrees: float = 1.0
+                     ) -> "SampleIndex":
+        grid_columns = int(math.ceil(360.0 / cell_degrees))
+        grid_rows = int(math.ceil(180.0 / cell_degrees))
+        located = np.flatnonzero(~np.isnan(columns["lat"]))
+        rows = np.minimum(((columns["lat"][located] + 90.0) // cell_degrees).astype(np.int64), grid_rows - 1)
+        cols = np.minimum(((columns["lon"][located] + 180.0) // cell_degrees).astype(np.int64), grid_columns - 1)
+        cells = rows * grid_columns + cols
+        cell_sort = np.argsort(cells, kind="stable")
+
+        dated = np.flatnonzero(columns["time_start"] != MISSING_TIME)
+        time_sort = np.argsort(columns["time_start"][dated], kind="stable")
+        durations = columns["time_end"][dated] - columns["time_start"][dated]
+
+        return cls(
+            ids=ids,
+            columns=columns,
+            cell_degrees=cell_degrees,
+            cell_order=located[cell_sort],
+            cell_ids=cells[cell_sort],
+            time_order=dated[time_sort],
+            time_starts=columns["time_start"][dated][time_sort],
+            max_duration=int(durations.max()) if len(durations) else 0,
+        )
+
+    @classmethod
+    def load(cls, index_file: str) -> "SampleIndex":
+        with np.load(index_file, allow_pickle=False) as stored:
+            meta = json.loads(str(stored["meta"]))
+            if meta["format"] != SAMPLE_INDEX_FORMAT:
+                raise ValueError(f"{index_file} is a format {meta['format']} sample index, "
+                                 f"expected {SAMPLE_INDEX_FORMAT}; rebuild it")
+            return cls(
+                ids=stored["ids"],
+                columns={column: stored[column] for column in COLUMNS},
+                cell_degrees=meta["cell_degrees"],
+                cell_order=stored["cell_order"],
+                cell_ids=stored["cell_ids"],
+                time_order=stored["time_order"],
+                time_starts=stored["time_starts"],
+                max_duration=meta["max_duration"],
+            )
+
+    def save(self, index_file: str):
+        index_dir = os.path.dirname(index_file)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        meta = {"format": SAMPLE_INDEX_FORMAT, "cell_degrees": self.cell_degrees, "max_duration": self.max_duration}
+        with open(index_file, "wb") as index_handle:
+            np.savez(index_handle, meta=np.array(json.dumps(meta)), ids=self.ids, cell_order=self.cell_order,
+                     cell_ids=self.cell_ids, time_order=self.time_order, time_starts=self.time_starts,
+                     **self.columns)
+
+    def grid_candidates(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """Sample positions in the grid cells overlapping a box that doesn't cross the antimeridian."""
+        first_row = max(int((south + 90.0) // self.cell_degrees), 0)
+        last_row = min(int((north + 90.0) // self.cell_degrees), self.grid_rows - 1)
+        first_col = max(int((west + 180.0) // self.cell_degrees), 0)
+        last_col = min(int((east + 180.0) // self.cell_degrees), self.grid_columns - 1)
+        if first_row > last_row or first_col > last_col:
+            return np.empty(0, dtype=np.int64)
+
+        row_starts = np.arange(first_row, last_row + 1, dtype=np.int64) * self.grid_columns
+        lows = np.searchsorted(self.cell_ids, row_starts + first_col, side="left")
+        highs = np.searchsorted(self.cell_ids, row_starts + last_col, side="right")
+        lengths = highs - lows
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # concatenate the slices [low, high) without a Python loop
+        offsets = np.repeat(lows - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return self.cell_order[np.arange(total, dtype=np.int64) + offsets]
+
+    def bbox(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """
+        Sample positions inside a lat/lon bounding box, in decimal degrees. A box with west > east
+        crosses the antimeridian.
+        """
+        if west > east:
+            return np.union1d(self.bbox(south, west, north, 180.0), self.bbox(south, -180.0, north, east))
+        candidates = self.grid_candidates(south, west, north, east)
+        lat, lon = self.columns["lat"][candidates], self.columns["lon"][candidates]
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.sort(candidates[inside])
+
+    def radius(self, lat: float, lon: float, km: float) -> np.ndarray:
+        """Sample positions within km great-circle kilometres of a point."""
+        lat_span = km / KM_PER_DEGREE
+        south, north = max(lat - lat_span, -90.0), min(lat + lat_span, 90.0)
+        polar = max(abs(south), abs(north))
+        if polar >= 90.0:
+            candidates = self.grid_candidates(south, -180.0, north, 180.0)
+        else:
+            lon_span = lat_span / math.cos(math.radians(polar))
+            if lon_span >= 180.0:
+                candidates = self.grid_candidates(south, -180.0, north, 180.0)
+            elif lon - lon_span < -180.0 or lon + lon_span > 180.0:
+                west, east = (lon - lon_span + 540.0) % 360.0 - 180.0, (lon + lon_span + 540.0) % 360.0 - 180.0
+                candidates = np.concatenate((self.grid_candidates(south, west, north, 180.0),
+                                             self.grid_candidates(south, -180.0, north, east)))
+            else:
+                candidates = self.grid_candidates(south, lon - lon_span, north, lon + lon_span)
+
+        phi1, phi2 = math.radians(lat), np.radians(self.columns["lat"][candidates])
+        d_phi = phi2 - phi1
+        d_lambda = np.radians(self.columns["lon"][candidates] - lon)
+        haversine = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(haversine, 1.0)))
+        return np.unique(candidates[distances <= km])
+
+    def date_range(self, start: Any, end: Any) -> np.ndarray:
+        """
+        Sample positions whose collection_date overlaps [start, end]. start and end are anything
+        parse_collection_date accepts, or None for an open end; a truncated end ("2020") includes
+        the whole of that period.
+        """
+        start_interval = parse_collection_date(start) if start is not None else None
+        end_interval = parse_collection_date(end) if end is not None else None
+        if (start is not None and start_interval is None) or (end is not None and end_interval is None):
+            raise ValueError(f"can't parse date range {start!r} - {end!r}")
+        # open ends are the int64 bounds, not sentinel dates, which datetime can't represent past year 9999
+        range_start = start_interval[0] if start_interval else np.iinfo(np.int64).min
+        range_end = end_interval[1] if end_interval else np.iinfo(np.int64).max
+        first = 0 if start_interval is None else \
+            np.searchsorted(self.time_starts, range_start - self.max_duration, side="left")
+        last = np.searchsorted(self.time_starts, range_end, side="left") if end_interval else len(self.time_starts)
+        candidates = self.time_order[first:last]
+        overlapping = self.columns["time_end"][candidates] > range_start
+        return np.sort(candidates[overlapping])
+
+    def measurement_range(self, slot_name: str, low: Optional[float], high: Optional[float],
+                          positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Filters positions (default: all samples) to those whose depth or elev interval overlaps [low, high] m."""
+        if positions is None:
+            positions = np.arange(len(self.ids), dtype=np.int64)
+        keep = ~np.isnan(self.columns[f"{slot_name}_min"][positions])
+        if low is not None:
+            keep &= self.columns[f"{slot_name}_max"][positions] >= low
+        if high is not None:
+            keep &= self.columns[f"{slot_name}_min"][positions] <= high
+        return positions[keep]
+
+    def query(self, bbox: Optional[Tuple[float, float, float, float]] = None,
+              near: Optional[Tuple[float, float, float]] = None, start: Any = None, end: Any = None,
+              depth: Optional[Tuple[Optional[float], Optional[float]]] = None,
+              elev: Optional[Tuple[Optional[float], Optional[float]]] = None) -> np.ndarray:
+        """Intersects any combination of bbox (south, west, north, east), near (lat, lon, km), date and depth/elev ranges."""
+        positions = None
+        if bbox is not None:
+            positions = self.bbox(*bbox)
+        if near is not None:
+            found = self.radius(*near)
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+        if start is not None or end is not None:
+            found = self.date_range(start, end)
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+        if depth is not None:
+            positions = self.measurement_range("depth", depth[0], depth[1], positions)
+        if elev is not None:
+            positions = self.measurement_range("elev", elev[0], elev[1], positions)
+        return positions if positions is not None else np.arange(len(self.ids), dtype=np.int64)
+
+    def describe(self, position: int) -> Dict[str, Any]:
+        columns = self.columns
+        sample = {"id": str(self.ids[position])}
+        if not math.isnan(columns["lat"][position]):
+            sample["lat_lon"] = [float(columns["lat"][position]), float(columns["lon"][position])]
+        if columns["time_start"][position] != MISSING_TIME:
+            sample["collection_date"] = [
+                datetime.datetime.fromtimestamp(int(columns[bound][position]), datetime.timezone.utc).isoformat()
+                for bound in ("time_start", "time_end")
+            ]
+        for slot_name in ("depth", "elev"):
+            if not math.isnan(columns[f"{slot_name}_min"][position]):
+                sample[slot_name] = [float(columns[f"{slot_name}_min"][position]),
+                                     float(columns[f"{slot_name}_max"][position])]
+        return sample
+
+
+def parse_floats(value: Optional[str], count: int, option: str) -> Optional[Tuple[float, ...]]:
+    if value is None:
+        return None
+    parts = value.split(",")
+    if len(parts) != count:
+        raise click.BadParameter(f"expected {count} comma-separated numbers", param_hint=option)
+    return tuple(float(part) for part in parts)
+
+
+def parse_interval(value: Optional[str], option: str) -> Optional[Tuple[Optional[float], Optional[float]]]:
+    if value is None:
+        return None
+    low, _, high = value.partition(":")
+    try:
+        return float(low) if low else None, float(high) if high else None
+    except ValueError:
+        raise click.BadParameter("expected LOW:HIGH in meters; either side may be empty", param_hint=option)
+
+
+@click.group()
+def sample_index():
+    """
+    Builds and queries a spatial/temporal index over MIxS sample records.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+
+@sample_index.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--compiled-cache', default='project/mixs-compiled.json',
+              help='Compiled schema cache, for reading Excel templates (default: project/mixs-compiled.json)')
+@click.option('--proto', default='project/protobuf/mixs.proto', help='Generated .proto file, for .pb inputs')
+@click.option('--input', '-i', 'input_files', multiple=True, required=True, type=click.Path(exists=True, dir_okay=False),
+              help='MixsCompliantData .yaml/.json, records .jsonl, .xlsx template or mixs-protobuf .pb; repeatable')
+@click.option('--output', '-o', default='project/mixs-sample-index.npz', help='Where to write the index')
+@click.option('--cell-degrees', default=1.0, type=float, help='Spatial grid cell size in degrees (default: 1)')
+def build(schema, compiled_cache, proto, input_files, output, cell_degrees):
+    """Parses lat_lon, collection_date, depth and elev from the inputs and saves the index."""
+    builder = SampleIndexBuilder()
+    for input_file in input_files:
+        builder.add_all(read_records(input_file, schema, compiled_cache, proto))
+    index = builder.build(cell_degrees)
+    index.save(output)
+    logger.info(f"Indexed {len(index)} samples into {output}; unparseable values: {builder.unparsed}")
+
+
+@sample_index.command()
+@click.option('--index', 'index_file', default='project/mixs-sample-index.npz', type=click.Path(exists=True),
+              help='Index written by build')
+@click.option('--bbox', help='SOUTH,WEST,NORTH,EAST in decimal degrees')
+@click.option('--near', help='LAT,LON,KM: samples within KM kilometres of a point')
+@click.option('--from', 'start', help='Earliest collection_date, e.g. 2019 or 2019-06-01')
+@click.option('--to', 'end', help='Latest collection_date; truncated dates include the whole period')
+@click.option('--depth', help='LOW:HIGH depth in meters')
+@click.option('--elev', help='LOW:HIGH elevation in meters')
+@click.option('--limit', default=100, type=int, help='Most samples to print (default: 100)')
+def query(index_file, bbox, near, start, end, depth, elev, limit):
+    """Prints the samples matching every given filter as JSON lines."""
+    index = SampleIndex.load(index_file)
+    positions = index.query(
+        bbox=parse_floats(bbox, 4, "--bbox"),
+        near=parse_floats(near, 3, "--near"),
+        start=start,
+        end=end,
+        depth=parse_interval(depth, "--depth"),
+        elev=parse_interval(elev, "--elev"),
+    )
+    for position in positions[:limit]:
+        click.echo(json.dumps(index.describe(int(position))))
+    logger.info(f"{len(positions)} of {len(index)} samples match")
+
+
+if __name__ == '__main__':
+    sample_index()
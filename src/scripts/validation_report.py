@@ -0,0 +1,243 @@
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import click
+import yaml
+
+from scripts.compiled_schema import CompiledSchema
+from scripts.regex_safety import pattern_compiler
+
+logger = logging.getLogger(__name__)
+
+SHAPE_LENGTH = 40
+
+SHAPE_TOKENS = re.compile(r"(\d+)|([^\W\d_]+)|(\s+)")
+
+OTHER_SHAPE = "<other>"
+
+
+def shape_token(match: "re.Match") -> str:
+    digits, letters, _ = match.groups()
+    if digits:
+        return "9"
+    if letters:
+        return "a"
+    return " "
+
+
+@lru_cache(maxsize=65536)
+def string_shape(value: str) -> str:
+    shape = SHAPE_TOKENS.sub(shape_token, value.strip())
+    return shape[:SHAPE_LENGTH] + "…" if len(shape) > SHAPE_LENGTH else shape
+
+
+def value_shape(value: Any) -> str:
+    """
+    Normalizes a value to its shape, so that errors caused by the same systematic problem group
+    together: runs of digits become 9, runs of letters become a, whitespace becomes one space and
+    punctuation is kept. "10" and "250" are both 9, "10 meter" is "9 a" and "0-5cm" is "9-9a".
+    """
+    if value is None:
+        return "<missing>"
+    if isinstance(value, bool):
+        return "<boolean>"
+    if isinstance(value, (int, float)):
+        return "<number>"
+    if isinstance(value, (list, dict)):
+        return f"<{type(value).__name__}>"
+    text = str(value)
+    if not text.strip():
+        return "<blank>"
+    return string_shape(text)
+
+
+class ErrorGroup:
+    """Everything kept about one (class, slot, rule, value shape) group."""
+
+    __slots__ = ("count", "message", "rows", "examples", "sampling")
+
+    def __init__(self, message: str):
+        self.count = 0
+        self.message = message
+        self.rows: List[Any] = []
+        self.examples: List[Any] = []
+        self.sampling = True
+
+    def sample(self, row: Any, value: Any, sample_rows: int, examples: int):
+        if len(self.rows) < sample_rows and (not self.rows or self.rows[-1] != row):
+            self.rows.append(row)
+        if len(self.examples) < examples and value is not None and value not in self.examples:
+            self.examples.append(value)
+        # once both are full (or a missing-value group's rows are), the hot path is just the count
+        self.sampling = len(self.rows) < sample_rows or (value is not None and len(self.examples) < examples)
+
+
+class ValidationReport:
+    """
+    Aggregates validation errors online instead of listing each one.
+
+    Errors are grouped by (class, slot, rule, value shape). Each group keeps a count, its first
+    message, the first sample_rows row numbers and up to examples distinct values, so memory
+    depends on how many distinct problems there are, not how many rows have them. Once there are
+    max_groups groups, errors with a new shape are counted in their (class, slot, rule)'s <other>
+    group. Every individual error can optionally also be streamed to a gzipped JSON lines sidecar.
+    """
+
+    def __init__(self, sample_rows: int = 10, examples: int = 3, max_groups: int = 10000,
+                 sidecar: Optional[str] = None):
+        self.sample_rows = sample_rows
+        self.examples = examples
+        self.max_groups = max_groups
+        self.groups: Dict[Tuple[str, Optional[str], str, str], ErrorGroup] = {}
+        self.records = 0
+        self.invalid_records = 0
+        self.errors = 0
+        self.sidecar_file = sidecar
+        self.sidecar = gzip.open(sidecar, "wt", compresslevel=1) if sidecar else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.sidecar is not None:
+            self.sidecar.close()
+            self.sidecar = None
+
+    def add(self, row: Any, class_name: str, errors: List[Dict[str, Any]]):
+        """Adds one validated record's errors; call it for valid records too, so they are counted."""
+        self.records += 1
+        if not errors:
+            return
+        self.invalid_records += 1
+        self.errors += len(errors)
+        groups = self.groups
+        for error in errors:
+            value = error.get("value")
+            key = (class_name, error["slot"], error["rule"], "<missing>" if value is None else value_shape(value))
+            group = groups.get(key)
+            if group is None:
+                if len(groups) >= self.max_groups:
+                    key = key[:3] + (OTHER_SHAPE,)
+                    group = groups.get(key)
+                if group is None:
+                    group = groups[key] = ErrorGroup(error["message"])
+            group.count += 1
+            if group.sampling:
+                group.sample(row, value, self.sample_rows, self.examples)
+        if self.sidecar is not None:
+            self.sidecar.write(json.dumps({"row": row, "class": class_name, "errors": errors},
+                                          separators=(",", ":"), default=str))
+            self.sidecar.write("\n")
+
+    def summary(self) -> Dict[str, Any]:
+        """The groups, most frequent first, with totals."""
+        ordered = sorted(self.groups.items(), key=lambda item: -item[1].count)
+        return {
+            "records": self.records,
+            "invalid_records": self.invalid_records,
+            "errors": self.errors,
+            "groups": len(self.groups),
+            "sidecar": self.sidecar_file,
+            "problems": [
+                {
+                    "class": class_name,
+                    "slot": slot_name,
+                    "rule": rule,
+                    "shape": shape,
+                    "count": group.count,
+                    "message": group.message,
+                    "rows": group.rows,
+                    "examples": group.examples,
+                }
+                for (class_name, slot_name, rule, shape), group in ordered
+            ],
+        }
+
+    def write(self, report_file: str):
+        report_dir = os.path.dirname(report_file)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(report_file, "w") as report_handle:
+            yaml.safe_dump(self.summary(), report_handle, sort_keys=False, allow_unicode=True)
+
+
+def read_classified_records(path: str, compiled: CompiledSchema, class_name: Optional[str] = None
+                            ) -> Iterator[Tuple[Any, str, Dict[str, Any]]]:
+    """
+    Yields (row, class name, record): worksheet row numbers for .xlsx templates, line numbers for
+    .jsonl records (which need class_name), and container:position for MixsCompliantData
+    .yaml/.json documents.
+    """
+    if path.endswith(".xlsx"):
+        from scripts.excel_ingest import TemplateReader
+
+        with TemplateReader(path, compiled, class_name) as reader:
+            for row_number, record in reader.rows():
+                yield row_number, reader.class_name, record
+    elif path.endswith(".jsonl"):
+        if class_name is None:
+            raise click.UsageError("--class-name is needed for .jsonl records")
+        with open(path) as jsonl_handle:
+            for line_number, line in enumerate(jsonl_handle, start=1):
+                if line.strip():
+                    yield line_number, class_name, json.loads(line)
+    else:
+        with open(path) as document_handle:
+            document = json.load(document_handle) if path.endswith(".json") else yaml.safe_load(document_handle)
+        for container_slot, records in (document or {}).items():
+            # an unknown container is reported by validate_record as an unknown class
+            record_class = compiled.class_for_container_slot(container_slot) or container_slot
+            for position, record in enumerate(records or []):
+                yield f"{container_slot}:{position}", record_class, record
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--compiled-cache', default='project/mixs-compiled.json',
+              help='Compiled schema cache; rebuilt when the schema changes (default: project/mixs-compiled.json)')
+@click.option('--input', '-i', 'input_file', type=click.Path(exists=True, dir_okay=False), required=True,
+              help='Filled-in .xlsx template, .jsonl records or MixsCompliantData .yaml/.json')
+@click.option('--class-name', help='MIxS class of the records (default: from the template or document)')
+@click.option('--output', '-o', default='validation-report.yaml', help='Summary report (default: validation-report.yaml)')
+@click.option('--sidecar', help='Also stream every error to this gzipped JSON lines file')
+@click.option('--sample-rows', default=10, type=int, help='Row numbers kept per problem (default: 10)')
+@click.option('--examples', default=3, type=int, help='Distinct example values kept per problem (default: 3)')
+@click.option('--max-groups', default=10000, type=int,
+              help='Most distinct problems tracked before new value shapes are lumped together (default: 10000)')
+@click.option('--regex-backend', type=click.Choice(['re', 're2', 'budget']), default='re',
+              help='Pattern engine, as for mixs-validation-service (default: re)')
+@click.option('--match-budget-ms', default=50.0, type=float,
+              help='Per-match time budget for the budget backend (default: 50 ms)')
+def validation_report(schema, compiled_cache, input_file, class_name, output, sidecar, sample_rows, examples,
+                      max_groups, regex_backend, match_budget_ms):
+    """
+    Validates a large submission and summarizes its errors by class, slot, rule and value shape.
+    """
+    logging.basicConfig(level=logging.INFO)
+    compiled = CompiledSchema.load(schema, compiled_cache)
+    if regex_backend != "re":
+        compiled.compile_patterns(pattern_compiler(regex_backend, match_budget_ms))
+
+    started = time.perf_counter()
+    with ValidationReport(sample_rows, examples, max_groups, sidecar) as report:
+        for row, record_class, record in read_classified_records(input_file, compiled, class_name):
+            report.add(row, record_class, compiled.validate_record(record_class, record))
+    report.write(output)
+    logger.info(f"{report.invalid_records} of {report.records} records invalid, {report.errors} errors in "
+                f"{len(report.groups)} groups, {time.perf_counter() - started:.1f}s; summary in {output}")
+
+
+if __name__ == '__main__':
+    validation_report()
@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+
+import click
+
+from scripts.compiled_schema import CompiledSchema
+from scripts.regex_safety import pattern_compiler
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ValidationBatcher:
+    """
+    Coalesces concurrent validation requests into micro-batches.
+
+    Requests are queued with a future. A single consumer takes the first waiting request, keeps
+    collecting until either max_batch_size records are waiting or max_latency_ms has passed, and
+    validates the whole batch in one executor call, so the event loop stays free to accept
+    connections while the CPU-bound pattern matching runs.
+    """
+
+    def __init__(self, compiled: CompiledSchema, max_batch_size: int = 256, max_latency_ms: float = 5.0):
+        self.compiled = compiled
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.queue: Optional[asyncio.Queue] = None
+        self.consumer: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.records = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.consumer = asyncio.get_running_loop().create_task(self.consume())
+
+    async def stop(self):
+        if self.consumer is not None:
+            self.consumer.cancel()
+            try:
+                await self.consumer
+            except asyncio.CancelledError:
+                pass
+
+    async def validate(self, class_name: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((class_name, record, future))
+        return await future
+
+    def validate_batch(self, batch: List[Tuple[str, Dict[str, Any], asyncio.Future]]) -> List[Any]:
+        results = []
+        for class_name, record, _ in batch:
+            try:
+                results.append(self.compiled.validate_record(class_name, record))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            results = await loop.run_in_executor(None, self.validate_batch, batch)
+            self.batches += 1
+            self.records += len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+class ValidationService:
+    """
+    A dependency-free HTTP/1.1 front end for CompiledSchema validation.
+
+    Endpoints:
+      GET  /health
+      GET  /classes                       class names and kinds
+      GET  /classes/{class_name}/slots    induced slots of one class
+      GET  /slots/{slot_name}             one slot's definition
+      POST /validate/{class_name}         body: one record, or a list of records
+      POST /validate                      body: a MixsCompliantData document
+
+    Metadata responses carry an ETag derived from the compiled schema fingerprint and answer
+    If-None-Match with 304.
+    """
+
+    def __init__(self, compiled: CompiledSchema, batcher: ValidationBatcher):
+        self.compiled = compiled
+        self.batcher = batcher
+        self.metadata_cache: Dict[str, Tuple[bytes, str]] = {}
+
+    def metadata(self, path: str) -> Tuple[bytes, str]:
+        """Returns the serialized body and ETag for a metadata path, building each one only once."""
+        if path in self.metadata_cache:
+            return self.metadata_cache[path]
+
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["classes"]:
+            payload = self.compiled.class_kinds
+        elif len(parts) == 3 and parts[0] == "classes" and parts[2] == "slots":
+            if parts[1] not in self.compiled.classes:
+                raise HttpError(404, f"unknown class {parts[1]}")
+            payload = [rule.to_dict() for rule in self.compiled.classes[parts[1]].values()]
+        elif len(parts) == 2 and parts[0] == "slots":
+            if parts[1] not in self.compiled.slots:
+                raise HttpError(404, f"unknown slot {parts[1]}")
+            rule = self.compiled.slots[parts[1]].to_dict()
+            payload = {
+                "name": rule["name"],
+                "title": rule["title"],
+                "description": rule["description"],
+                "slot_uri": rule["slot_uri"],
+                "range": rule["range"],
+                "multivalued": rule["multivalued"],
+                "pattern": rule["pattern"],
+                "permissible_values": rule["permissible_values"],
+                "classes": sorted(
+                    class_name for class_name, class_rules in self.compiled.classes.items()
+                    if parts[1] in class_rules
+                ),
+            }
+        else:
+            raise HttpError(404, f"no such resource {path}")
+
+        body = json.dumps(payload).encode()
+        etag = '"' + hashlib.sha256(self.compiled.fingerprint.encode() + body).hexdigest()[:32] + '"'
+        self.metadata_cache[path] = (body, etag)
+        return body, etag
+
+    async def validate(self, path: str, body: bytes) -> Any:
+        try:
+            document = json.loads(body or b"null")
+        except ValueError as e:
+            raise HttpError(400, f"request body is not JSON: {e}")
+
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if len(parts) == 2:
+            class_name = parts[1]
+            if class_name not in self.compiled.classes:
+                raise HttpError(404, f"unknown class {class_name}")
+            if isinstance(document, dict):
+                errors = await self.batcher.validate(class_name, document)
+                return {"valid": not errors, "errors": errors}
+            if isinstance(document, list):
+                if not all(isinstance(record, dict) for record in document):
+                    raise HttpError(400, "expected a list of record objects")
+                results = await asyncio.gather(*[self.batcher.validate(class_name, r) for r in document])
+                return [{"valid": not errors, "errors": errors} for errors in results]
+            raise HttpError(400, "expected a record or a list of records")
+
+        if not isinstance(document, dict):
+            raise HttpError(400, "expected a MixsCompliantData document")
+        # check the whole document before queueing anything, so a bad container leaves no work behind
+        pending = []
+        for container_slot, records in document.items():
+            class_name = self.compiled.class_for_container_slot(container_slot)
+            if class_name is None:
+                raise HttpError(400, f"{container_slot} is not a MixsCompliantData slot")
+            if records is None:
+                continue
+            if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+                raise HttpError(400, f"{container_slot} must be a list of record objects")
+            for row, record in enumerate(records):
+                pending.append((container_slot, row, class_name, record))
+        results = await asyncio.gather(
+            *[self.batcher.validate(class_name, record) for _, _, class_name, record in pending])
+        errors = [
+            {"container": container_slot, "row": row, **error}
+            for (container_slot, row, _, _), record_errors in zip(pending, results)
+            for error in record_errors
+        ]
+        return {"valid": not errors, "records": len(pending), "errors": errors}
+
+    async def dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes
+                       ) -> Tuple[int, Dict[str, str], bytes]:
+        if path == "/health":
+            payload = {"status": "ok", "schema_version": self.compiled.version,
+                       "batches": self.batcher.batches, "records": self.batcher.records}
+            return 200, {}, json.dumps(payload).encode()
+
+        if path == "/validate" or path.startswith("/validate/"):
+            if method != "POST":
+                raise HttpError(405, "use POST to validate")
+            return 200, {}, json.dumps(await self.validate(path, body)).encode()
+
+        if method not in ("GET", "HEAD"):
+            raise HttpError(405, "metadata endpoints are read-only")
+        metadata_body, etag = self.metadata(path)
+        cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=0, must-revalidate"}
+        if headers.get("if-none-match") == etag:
+            return 304, cache_headers, b""
+        return 200, cache_headers, metadata_body
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header_line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, response_headers, response_body = 200, {}, b""
+                try:
+                    if "chunked" in headers.get("transfer-encoding", "").lower():
+                        # the chunks would otherwise be read as the next request line
+                        keep_alive = False
+                        raise HttpError(411, "chunked request bodies are not supported; send Content-Length")
+                    try:
+                        content_length = int(headers.get("content-length", "0"))
+                    except ValueError:
+                        keep_alive = False
+                        raise HttpError(400, "Content-Length is not an integer")
+                    if content_length < 0:
+                        keep_alive = False
+                        raise HttpError(400, "Content-Length is negative")
+                    if content_length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HttpError(413, f"request bodies are limited to {MAX_BODY_BYTES} bytes")
+                    body = await reader.readexactly(content_length) if content_length else b""
+                    status, response_headers, response_body = await self.dispatch(
+                        method, urlsplit(target).path, headers, body)
+                except HttpError as e:
+                    status, response_body = e.status, json.dumps({"error": e.message}).encode()
+                except Exception as e:
+                    logger.exception("unhandled error")
+                    status, response_body = 500, json.dumps({"error": str(e)}).encode()
+
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+                response_headers.setdefault("Content-Type", "application/json")
+                response_headers["Content-Length"] = str(len(response_body))
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                head.extend(f"{k}: {v}" for k, v in response_headers.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(response_body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve_forever(compiled: CompiledSchema, host: str, port: int, max_batch_size: int,
+                        max_latency_ms: float):
+    batcher = ValidationBatcher(compiled, max_batch_size=max_batch_size, max_latency_ms=max_latency_ms)
+    batcher.start()
+    service = ValidationService(compiled, batcher)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    logger.info(f"Serving {len(compiled.classes)} MIxS classes on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+@click.command()
+@click.option('--schema', '-s',
+              default='src/mixs/schema/mixs.yaml',
+              required=True,
+              help='Path to the schema file')
+@click.option('--compiled-cache', default='project/mixs-compiled.json',
+              help='Compiled schema cache; rebuilt when the schema changes (default: project/mixs-compiled.json)')
+@click.option('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+@click.option('--port', default=8080, type=int, help='Port to listen on (default: 8080)')
+@click.option('--max-batch-size', default=256, type=int,
+              help='Most records validated together in one micro-batch (default: 256)')
+@click.option('--max-latency-ms', default=5.0, type=float,
+              help='Longest a request waits for its micro-batch to fill (default: 5 ms)')
+@click.option('--regex-backend', type=click.Choice(['re', 're2', 'budget']), default='re',
+              help='re: backtracking; re2: linear-time (needs google-re2); '
+                   'budget: re with a per-match time budget for patterns flagged by regex-safety')
+@click.option('--match-budget-ms', default=50.0, type=float,
+              help='Per-match time budget for the budget backend (default: 50 ms)')
+def serve(schema, compiled_cache, host, port, max_batch_size, max_latency_ms, regex_backend, match_budget_ms):
+    logging.basicConfig(level=logging.INFO)
+    compiled = CompiledSchema.load(schema, compiled_cache)
+    compiled.compile_patterns(pattern_compiler(regex_backend, match_budget_ms))
+    asyncio.run(serve_forever(compiled, host, port, max_batch_size, max_latency_ms))
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,10 @@
+"""Synthetic compiled schemas shared by the tests."""
+from typing import Dict
+
+from scripts.compiled_schema import CompiledSchema, SlotRule
+
+
+def small_schema(rules: Dict[str, SlotRule]) -> CompiledSchema:
+    """A one-class MimsSoil stand-in for the compiled MIxS schema, so tests don't induce all 287 classes."""
+    return CompiledSchema("fingerprint", "6.2.0", {}, {"MimsSoil": rules}, {"MimsSoil": "combination"},
+                          {"mims_soil_data": "MimsSoil"})
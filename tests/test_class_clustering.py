@@ -0,0 +1,87 @@
+"""Class clustering test."""
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from scripts.class_clustering import ClassDistances, linkage_document
+from scripts.compiled_schema import CompiledSchema, SlotRule
+
+WEIGHTS = (3.0, 2.0, 1.0)
+
+
+def random_schema(seed: int) -> CompiledSchema:
+    generator = random.Random(seed)
+    slot_names = [f"slot_{number}" for number in range(80)]
+    classes = {}
+    for number in range(25):
+        rules = {}
+        for slot_name in generator.sample(slot_names, generator.randrange(3, 40)):
+            status = generator.random()
+            rules[slot_name] = SlotRule(slot_name, required=status < 0.2, recommended=0.2 <= status < 0.4)
+        classes[f"Class{number}"] = rules
+    return CompiledSchema("fingerprint", "6.2.0", {}, classes, {class_name: "combination" for class_name in classes},
+                          {})
+
+
+class TestClassClustering(unittest.TestCase):
+    """Cache distances per class fingerprint and recompute only what changed."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.directory.name, "distances.npz")
+        self.compiled = random_schema(5)
+        self.class_names = sorted(self.compiled.classes)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_weighted_jaccard(self):
+        """Distances follow 1 - sum(min) / sum(max) of the slot weights."""
+        compiled = CompiledSchema("fingerprint", "6.2.0", {}, {
+            "A": {"x": SlotRule("x", required=True), "y": SlotRule("y")},
+            "B": {"x": SlotRule("x"), "z": SlotRule("z", recommended=True)},
+        }, {"A": "combination", "B": "combination"}, {})
+        distances, recomputed = ClassDistances.compute(compiled, ["A", "B"], WEIGHTS)
+        self.assertEqual(recomputed, 2)
+        # min: x 1; max: x 3, y 1, z 2
+        self.assertAlmostEqual(distances.distances[0, 1], 1 - 1 / 6)
+        self.assertEqual(distances.distances[0, 0], 0.0)
+
+    def test_cache(self):
+        """A second run recomputes nothing, and a changed class only its own row."""
+        first, recomputed = ClassDistances.compute(self.compiled, self.class_names, WEIGHTS, self.cache_file)
+        self.assertEqual(recomputed, len(self.class_names))
+        second, recomputed = ClassDistances.compute(self.compiled, self.class_names, WEIGHTS, self.cache_file)
+        self.assertEqual(recomputed, 0)
+        np.testing.assert_array_equal(second.distances, first.distances)
+
+        self.compiled.classes["Class3"]["slot_79"] = SlotRule("slot_79", required=True)
+        self.compiled.classes["Class3"].pop(next(iter(self.compiled.classes["Class3"])))
+        class_names = self.class_names + ["Class25"]
+        self.compiled.classes["Class25"] = dict(self.compiled.classes["Class7"])
+        self.compiled.class_kinds["Class25"] = "combination"
+        third, recomputed = ClassDistances.compute(self.compiled, class_names, WEIGHTS, self.cache_file)
+        self.assertEqual(recomputed, 2)
+        fresh, _ = ClassDistances.compute(self.compiled, class_names, WEIGHTS)
+        np.testing.assert_allclose(third.distances, fresh.distances)
+        self.assertEqual(third.distances[class_names.index("Class7"), class_names.index("Class25")], 0.0)
+
+        _, recomputed = ClassDistances.compute(self.compiled, class_names, (1.0, 1.0, 1.0), self.cache_file)
+        self.assertEqual(recomputed, len(class_names))
+
+    def test_linkage_document(self):
+        """The linkage JSON nests every class exactly once."""
+        distances, _ = ClassDistances.compute(self.compiled, self.class_names, WEIGHTS)
+        linkage_matrix = distances.linkage("complete")
+        document = linkage_document(linkage_matrix, self.class_names, self.compiled.class_kinds,
+                                    list(range(len(self.class_names))), "complete", WEIGHTS)
+
+        def leaves(node):
+            return [node["name"]] if "name" in node else leaves(node["children"][0]) + leaves(node["children"][1])
+
+        self.assertEqual(sorted(leaves(document["tree"])), self.class_names)
+        self.assertEqual(document["tree"]["count"], len(self.class_names))
+        self.assertEqual(len(document["linkage"]), len(self.class_names) - 1)
@@ -0,0 +1,87 @@
+"""Class detector test."""
+import random
+import unittest
+
+from scripts.class_detector import BATCH_SIZE, ClassDetector
+from scripts.compiled_schema import CompiledSchema, SlotRule
+
+
+def random_schema(generator: random.Random) -> CompiledSchema:
+    """Forty combination classes over 150 slots, so bitsets span several words."""
+    slot_names = [f"slot_{number}" for number in range(150)]
+    classes, class_kinds = {}, {}
+    for number in range(40):
+        rules = {}
+        for slot_name in generator.sample(slot_names, generator.randrange(5, 60)):
+            status = generator.random()
+            rules[slot_name] = SlotRule(slot_name, required=status < 0.2, recommended=0.2 <= status < 0.4)
+        classes[f"Class{number}"] = rules
+        class_kinds[f"Class{number}"] = "combination"
+    classes["Checklist"] = {"slot_0": SlotRule("slot_0", required=True)}
+    class_kinds["Checklist"] = "checklist"
+    return CompiledSchema("fingerprint", "6.2.0", {}, classes, class_kinds, {})
+
+
+def brute_force_key(compiled: CompiledSchema, class_name: str, record: dict):
+    """The detector's ranking key, computed slot by slot."""
+    rules = compiled.classes[class_name]
+    filled = [field for field, value in record.items() if value not in (None, "", [])]
+    required = [name for name, rule in rules.items() if rule.required]
+    recommended = [name for name, rule in rules.items() if rule.recommended]
+    required_coverage = sum(name in filled for name in required) / len(required) if required else 1.0
+    recommended_coverage = sum(name in filled for name in recommended) / len(recommended) if recommended else 1.0
+    extraneous = sum(field not in rules for field in filled)
+    return required_coverage, -extraneous, recommended_coverage, -len(rules)
+
+
+class TestClassDetector(unittest.TestCase):
+    """Rank classes for records and compare with a slot-by-slot scan."""
+
+    def test_specific_class_wins(self):
+        """Required coverage comes first, then fewest extraneous fields, then the most specific class."""
+        rules = {
+            "samp_name": SlotRule("samp_name", required=True),
+            "lat_lon": SlotRule("lat_lon", required=True),
+            "ph": SlotRule("ph", recommended=True),
+        }
+        compiled = CompiledSchema("fingerprint", "6.2.0", {}, {
+            "MimsSoil": dict(rules, cur_land_use=SlotRule("cur_land_use", required=True)),
+            "MimsWater": dict(rules, salinity=SlotRule("salinity")),
+            "MimsAir": dict(rules, salinity=SlotRule("salinity"), air_temp=SlotRule("air_temp")),
+        }, {"MimsSoil": "combination", "MimsWater": "combination", "MimsAir": "combination"}, {})
+        detector = ClassDetector(compiled)
+
+        ranking = detector.rank({"samp_name": "s1", "lat_lon": "1 2", "salinity": "3", "notes": "x"}, top=3)
+        self.assertEqual([candidate["class"] for candidate in ranking], ["MimsWater", "MimsAir", "MimsSoil"])
+        self.assertEqual(ranking[0]["extraneous_fraction"], 0.25)
+        self.assertEqual(ranking[0]["recommended_coverage"], 0.0)
+        self.assertEqual(ranking[2]["missing_required"], ["cur_land_use"])
+
+        sheet = detector.rank_sheet([{"samp_name": "s1"}, {"lat_lon": "1 2", "cur_land_use": "farm", "ph": ""}])
+        self.assertEqual((sheet[0]["class"], sheet[0]["required_coverage"]), ("MimsSoil", 1.0))
+
+    def test_matches_brute_force(self):
+        """Over several batches, the best class always has the best slot-by-slot key."""
+        generator = random.Random(11)
+        compiled = random_schema(generator)
+        detector = ClassDetector(compiled)
+        self.assertNotIn("Checklist", detector.class_names)
+
+        records = []
+        for _ in range(BATCH_SIZE * 2 + 17):
+            source = compiled.classes[generator.choice(detector.class_names)]
+            record = {slot_name: "x" for slot_name in source if generator.random() < 0.7}
+            if generator.random() < 0.3:
+                record[f"slot_{generator.randrange(150)}"] = "y"
+                record["not_a_slot"] = "z"
+            records.append(record)
+
+        best = list(detector.best_classes(records))
+        rankings = list(detector.rank_batch(records, top=4))
+        self.assertEqual(len(best), len(records))
+        for record, best_class, ranking in zip(records, best, rankings):
+            keys = {class_name: brute_force_key(compiled, class_name, record) for class_name in detector.class_names}
+            self.assertEqual(keys[best_class], max(keys.values()))
+            self.assertEqual(ranking[0]["class"], best_class)
+            self.assertEqual([keys[candidate["class"]] for candidate in ranking],
+                             sorted(keys.values(), reverse=True)[:4])
@@ -0,0 +1,105 @@
+"""Excel template ingest test."""
+import datetime
+import io
+import os
+import tempfile
+import unittest
+
+import click
+from openpyxl import Workbook
+
+from scripts.compiled_schema import SlotRule
+from scripts.excel_ingest import TemplateReader
+from scripts.protobuf_codec import MixsProtobufReader, MixsProtobufWriter, ProtoSchema
+from tests.schemas import small_schema
+
+SMALL_PROTO = """
+message MixsCompliantData
+ {
+ repeated  mimsSoil mimsSoilData = 0
+ }
+message MimsSoil
+ {
+  string sampName = 0
+  integer sampSize = 0
+ }
+"""
+
+
+class TestExcelIngest(unittest.TestCase):
+    """Read a generated template the way a submitter fills it in."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.compiled = small_schema({
+            "samp_name": SlotRule("samp_name", title="sample name", required=True),
+            "collection_date": SlotRule("collection_date", title="collection date"),
+            "elev": SlotRule("elev", title="elevation"),
+            "samp_size": SlotRule("samp_size", range="integer"),
+            "chem_administration": SlotRule("chem_administration", multivalued=True),
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def workbook(self, file_name, sheet_title, rows):
+        path = os.path.join(self.directory.name, file_name)
+        workbook = Workbook()
+        workbook.active.title = sheet_title
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        return path
+
+    def test_rows(self):
+        """Headers map by name or title, and cells become what the slots expect."""
+        path = self.workbook("submission.xlsx", "MimsSoil", [
+            ["sample name", "collection date", "elevation", "samp_size", "chem_administration", "lab_notes"],
+            ["s1", datetime.datetime(2021, 3, 4), 10.0, 5.0, "[water|salt ]", "dry"],
+            [None, None, None, None, None, None],
+            ["s2", datetime.datetime(2021, 3, 4, 13, 30), 2.5, "7", "water", None],
+        ])
+        with TemplateReader(path, self.compiled) as reader:
+            rows = list(reader.rows())
+        self.assertEqual(reader.class_name, "MimsSoil")
+        self.assertEqual(rows, [
+            (2, {"samp_name": "s1", "collection_date": "2021-03-04", "elev": "10", "samp_size": 5,
+                 "chem_administration": ["water", "salt"], "lab_notes": "dry"}),
+            (4, {"samp_name": "s2", "collection_date": "2021-03-04T13:30:00", "elev": "2.5", "samp_size": 7,
+                 "chem_administration": ["water"]}),
+        ])
+
+        with TemplateReader(path, self.compiled, drop_unknown_columns=True) as reader:
+            self.assertNotIn("lab_notes", next(reader.records()))
+            self.assertEqual(reader.unknown_columns, ["lab_notes"])
+
+    def test_unsupported_workbooks(self):
+        """Workbooks that aren't templates are reported as click errors, not tracebacks."""
+        path = self.workbook("mixs_v6.xlsx", "README", [["The MIxS checklist"], ["Column A"]])
+        with self.assertRaisesRegex(click.ClickException, "pass --class-name"):
+            TemplateReader(path, self.compiled)
+        with self.assertRaisesRegex(click.ClickException, "not a MIxS"):
+            TemplateReader(path, self.compiled, "Soil")
+        with self.assertRaisesRegex(click.ClickException, "no column of sheet README"):
+            with TemplateReader(path, self.compiled, "MimsSoil") as reader:
+                list(reader.rows())
+
+    def test_protobuf(self):
+        """Rows are written in batches, and a cell the codec can't carry is reported by its row."""
+        proto_file = os.path.join(self.directory.name, "small.proto")
+        with open(proto_file, "w") as proto_handle:
+            proto_handle.write(SMALL_PROTO)
+        proto_schema = ProtoSchema.from_proto_file(proto_file, ["mims_soil_data", "samp_name", "samp_size"])
+        rows = [["samp_name", "samp_size"]] + [[f"s{number}", number] for number in range(5)]
+
+        path = self.workbook("MimsSoil.xlsx", "MimsSoil", rows)
+        stream = io.BytesIO()
+        with TemplateReader(path, self.compiled) as reader:
+            self.assertEqual(reader.write_protobuf(MixsProtobufWriter(proto_schema, stream), batch_size=2), 5)
+        stream.seek(0)
+        self.assertEqual(len(list(MixsProtobufReader(proto_schema, stream))), 3)
+
+        path = self.workbook("MimsSoil.xlsx", "MimsSoil", rows + [["s5", "about 300"], ["s6", 6]])
+        with TemplateReader(path, self.compiled) as reader:
+            with self.assertRaisesRegex(click.ClickException, "row 7: MimsSoil.samp_size: can't encode 'about 300'"):
+                reader.write_protobuf(MixsProtobufWriter(proto_schema, io.BytesIO()), batch_size=3)
@@ -0,0 +1,69 @@
+"""Protobuf codec test."""
+import io
+import os
+import glob
+import unittest
+
+import yaml
+
+from scripts.protobuf_codec import load_proto_schema, MixsProtobufReader, MixsProtobufWriter
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+SCHEMA = os.path.join(ROOT, "src", "mixs", "schema", "mixs.yaml")
+PROTO = os.path.join(ROOT, "project", "protobuf", "mixs.proto")
+VALID_DIR = os.path.join(ROOT, "src", "data", "examples", "valid")
+
+EXAMPLE_FILES = glob.glob(os.path.join(VALID_DIR, '*.yaml'))
+
+
+class TestProtobufCodec(unittest.TestCase):
+    """Round-trip the valid examples through length-delimited protobuf."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.proto_schema = load_proto_schema(SCHEMA, PROTO)
+
+    def test_round_trip(self):
+        """Every valid example decodes to what was encoded, one record per delimited message."""
+        for path in EXAMPLE_FILES:
+            with open(path) as example:
+                document = yaml.safe_load(example)
+            stream = io.BytesIO()
+            writer = MixsProtobufWriter(self.proto_schema, stream)
+            for container_slot, records in document.items():
+                writer.write_records(container_slot, records, batch_size=1)
+            self.assertEqual(writer.messages, sum(len(records) for records in document.values()))
+
+            stream.seek(0)
+            decoded = {}
+            for container_slot, record in MixsProtobufReader(self.proto_schema, stream).records():
+                decoded.setdefault(container_slot, []).append(record)
+            self.assertEqual(decoded, document, path)
+
+    def test_undefined_slot(self):
+        """Slots that aren't fields of the message are rejected."""
+        stream = io.BytesIO()
+        writer = MixsProtobufWriter(self.proto_schema, stream)
+        with self.assertRaises(ValueError):
+            writer.write({"mims_soil_data": [{"undefined_slot": "x"}]})
+
+    def round_trip(self, document):
+        stream = io.BytesIO()
+        MixsProtobufWriter(self.proto_schema, stream).write(document)
+        stream.seek(0)
+        return next(iter(MixsProtobufReader(self.proto_schema, stream)))
+
+    def test_float_precision(self):
+        """float slots come back exactly, not rounded to float32's 7 significant digits."""
+        document = {"agriculture_data": [{"elev": "10 m", "soil_pH": 7.123456789}, {"soil_pH": 0.1}]}
+        self.assertEqual(self.round_trip(document), document)
+
+    def test_bad_values(self):
+        """Lists for single-valued slots and unconvertible numbers name the message and slot."""
+        writer = MixsProtobufWriter(self.proto_schema, io.BytesIO())
+        for record, message in [({"elev": ["a", "b"]}, "Agriculture.elev takes a single value"),
+                                ({"lib_size": "about 300"}, "Agriculture.lib_size: can't encode 'about 300'"),
+                                ({"lib_size": 2.5}, "Agriculture.lib_size: can't encode 2.5"),
+                                ({"soil_pH": "acidic"}, "Agriculture.soil_pH: can't encode 'acidic' as double")]:
+            with self.assertRaisesRegex(ValueError, message):
+                writer.write({"agriculture_data": [record]})
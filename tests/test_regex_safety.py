@@ -0,0 +1,50 @@
+"""Regex safety test."""
+import time
+import unittest
+
+from scripts.compiled_schema import SlotRule
+from scripts.regex_safety import BudgetedMatcher, BudgetedPattern, analyze_pattern, pattern_compiler
+from tests.schemas import small_schema
+
+# the termLabel/unit setting, twelve times over like a ;-separated structured_pattern
+TERM_LABEL = r"([^\s-]{1,2}|[^\s-]+.+[^\s-]+)"
+TWELVE_TERMS = "^" + ";".join([TERM_LABEL] * 12) + "$"
+
+BUDGET_MS = 200
+
+
+class TestRegexSafety(unittest.TestCase):
+    """Classify backtracking-prone patterns and bound matching them."""
+
+    def test_classification(self):
+        """Chains across groups whose separators the repeats consume claim no polynomial degree."""
+        findings = analyze_pattern(TWELVE_TERMS)
+        self.assertEqual([(f.kind, f.degree) for f in findings], [("overlapping_groups", None)])
+        self.assertEqual(findings[0].pump, "a;")
+        self.assertEqual([(f.kind, f.degree) for f in analyze_pattern("^" + TERM_LABEL + "$")],
+                         [("overlapping_repeats", 3)])
+        self.assertEqual(analyze_pattern(r"^(\d+) (\d+)$"), [])
+        self.assertEqual(analyze_pattern(r"^P(?:\d+D|\d+M)(?:T\d+H)?$"), [])
+
+    def test_budget_backend(self):
+        """A short worst-case value comes back as a pattern_budget error within the budget."""
+        compiled = small_schema({"terms": SlotRule("terms", pattern=TWELVE_TERMS)})
+        compiled.compile_patterns(pattern_compiler("budget", BUDGET_MS))
+        rule = compiled.classes["MimsSoil"]["terms"]
+        self.assertIsInstance(rule.regex, BudgetedPattern)
+
+        self.assertIsNone(compiled.check_value(rule, "a;" * 11 + "a"))
+        self.assertEqual(compiled.check_value(rule, "a;" * 11 + "a -")["rule"], "pattern")
+
+        started = time.perf_counter()
+        error = compiled.check_value(rule, "a;" * 25 + "a; -")
+        elapsed = time.perf_counter() - started
+        self.assertEqual(error["rule"], "pattern_budget")
+        self.assertLess(elapsed, BUDGET_MS / 1000 + 1.0)
+
+    def test_matcher_recovers(self):
+        """The worker is replaced after a timeout and keeps answering."""
+        matcher = BudgetedMatcher(BUDGET_MS)
+        with self.assertRaises(TimeoutError):
+            matcher.search(TWELVE_TERMS, "a;" * 25 + "a; -")
+        self.assertTrue(matcher.search(TWELVE_TERMS, "a;" * 11 + "a"))
@@ -0,0 +1,113 @@
+"""Release bundle test."""
+import datetime
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+from scripts.release_bundle import MANIFEST_FILE, ReleaseBundle, blob_path, normalize_workbook
+
+
+def write_template(path: str, cells, created: datetime.datetime):
+    workbook = Workbook()
+    for row in cells:
+        workbook.active.append(row)
+    workbook.properties.created = workbook.properties.modified = created
+    workbook.save(path)
+
+
+class TestReleaseBundle(unittest.TestCase):
+    """Build small bundles from two roots and sync between them."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_directory = os.getcwd()
+        # manifest paths are relative to where the bundle is built from
+        os.chdir(self.directory.name)
+        os.makedirs("project/jsonld")
+        os.makedirs("mixs-templates")
+        for number in range(3):
+            with open(f"project/jsonld/part{number}.jsonld", "w") as part_handle:
+                part_handle.write(f'{{"@id": "mixs:part{number}"}}\n' * 50)
+        with open("project/jsonld/copy.jsonld", "w") as copy_handle:
+            copy_handle.write('{"@id": "mixs:part0"}\n' * 50)
+        write_template("mixs-templates/MimsSoil.xlsx", [["samp_name"], ["s1"]], datetime.datetime(2024, 1, 1))
+        with open("project/mixs-compiled.json", "w") as cache_handle:
+            cache_handle.write('{"fingerprint": "cache"}\n')
+        self.roots = ["project", "mixs-templates"]
+
+    def tearDown(self):
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+
+    def test_build_and_verify(self):
+        """A built bundle verifies, a second pass rehashes nothing, and damage is reported."""
+        bundle = ReleaseBundle.build(self.roots, "bundle", "6.2.0")
+        artifacts = bundle.manifest["artifacts"]
+        self.assertEqual(len(artifacts), 4)
+        self.assertEqual(sum(len(entry["paths"]) for entry in artifacts.values()), 5)
+        paths = [path for entry in artifacts.values() for path in entry["paths"]]
+        self.assertNotIn("project/mixs-compiled.json", paths)
+        self.assertEqual(sorted(bundle.manifest["archives"]),
+                         ["archives/mixs-templates.tar.xz", "archives/project.tar.xz"])
+
+        self.assertEqual(bundle.verify(tree="."), [])
+        with self.assertLogs("scripts.release_bundle", "INFO") as logs:
+            self.assertEqual(bundle.verify(tree="."), [])
+        self.assertIn("Hashed 0 files", logs.output[-1])
+
+        part_hash = next(artifact_hash for artifact_hash, entry in artifacts.items()
+                         if entry["paths"] == ["project/jsonld/part1.jsonld"])
+        part_blob = os.path.join("bundle", blob_path(part_hash, artifacts[part_hash]["encoding"]))
+        with open(part_blob, "wb") as blob_handle:
+            blob_handle.write(b"corrupt")
+        os.remove("project/jsonld/part2.jsonld")
+        problems = bundle.verify(tree=".")
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(problems[0].startswith("hash mismatch: bundle/blobs/"))
+        self.assertEqual(problems[1], "missing: ./project/jsonld/part2.jsonld")
+
+    def test_workbook_normalization(self):
+        """Regenerating an unchanged template keeps its hash; changing a cell doesn't."""
+        with open("mixs-templates/MimsSoil.xlsx", "rb") as first_handle:
+            first = first_handle.read()
+        write_template("mixs-templates/MimsSoil.xlsx", [["samp_name"], ["s1"]], datetime.datetime(2025, 6, 30))
+        with open("mixs-templates/MimsSoil.xlsx", "rb") as second_handle:
+            second = second_handle.read()
+        self.assertNotEqual(first, second)
+        self.assertEqual(normalize_workbook(first), normalize_workbook(second))
+
+        # the blob is the workbook as released, not its normalized form
+        bundle = ReleaseBundle.build(self.roots, "bundle")
+        self.assertEqual(bundle.verify(), [])
+        bundle.unpack("unpacked")
+        with open("unpacked/mixs-templates/MimsSoil.xlsx", "rb") as unpacked_handle:
+            self.assertEqual(unpacked_handle.read(), second)
+
+        write_template("mixs-templates/MimsSoil.xlsx", [["samp_name"], ["s2"]], datetime.datetime(2024, 1, 1))
+        with open("mixs-templates/MimsSoil.xlsx", "rb") as changed_handle:
+            self.assertNotEqual(normalize_workbook(changed_handle.read()), normalize_workbook(first))
+
+    def test_delta(self):
+        """Only the new blobs and the manifest are fetched, unless archives are asked for."""
+        old = ReleaseBundle.build(self.roots, "old")
+        write_template("mixs-templates/MimsSoil.xlsx", [["samp_name"], ["s1"]], datetime.datetime(2025, 6, 30))
+        self.assertEqual(ReleaseBundle.build(self.roots, "unchanged").delta(old), [MANIFEST_FILE])
+
+        with open("project/jsonld/part0.jsonld", "a") as part_handle:
+            part_handle.write('{"@id": "mixs:changed"}\n')
+        write_template("mixs-templates/MimsSoil.xlsx", [["samp_name"], ["s2"]], datetime.datetime(2025, 6, 30))
+        new = ReleaseBundle.build(self.roots, "new")
+        delta = new.delta(old)
+        self.assertEqual(len(delta), 3)
+        self.assertTrue(all(name.startswith("blobs/") for name in delta[:2]))
+        self.assertEqual(len(new.delta(old, archives=True)), 5)
+
+        # a mirror that synced the delta verifies just those files
+        self.assertEqual(new.verify(since=old), [])
+
+        new.unpack("unpacked")
+        with open("unpacked/project/jsonld/part0.jsonld") as unpacked_handle, \
+                open("project/jsonld/part0.jsonld") as part_handle:
+            self.assertEqual(unpacked_handle.read(), part_handle.read())
@@ -0,0 +1,140 @@
+"""Sample index test."""
+import calendar
+import datetime
+import math
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+from click.testing import CliRunner
+
+from scripts.sample_index import (EARTH_RADIUS_KM, SampleIndex, SampleIndexBuilder, parse_collection_date,
+                                  parse_measurement, sample_index)
+
+
+def epoch(*args) -> int:
+    return calendar.timegm(datetime.datetime(*args).timetuple())
+
+
+def great_circle_km(lat1, lon1, lat2, lon2) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    haversine = math.sin((phi2 - phi1) / 2) ** 2 \
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(haversine, 1.0)))
+
+
+class TestSampleIndex(unittest.TestCase):
+    """Check parsing, and every query against a brute-force scan of random samples."""
+
+    @classmethod
+    def setUpClass(cls):
+        generator = random.Random(7)
+        cls.records = []
+        for number in range(3000):
+            record = {"samp_name": f"s{number}"}
+            if number % 50:
+                # crowd some samples near the poles and the antimeridian
+                lat = generator.choice([generator.uniform(-90, 90), generator.uniform(85, 90)])
+                lon = generator.choice([generator.uniform(-180, 180), generator.uniform(175, 180)])
+                record["lat_lon"] = f"{lat:.5f} {lon:.5f}"
+            if number % 40:
+                day = datetime.date(2000, 1, 1) + datetime.timedelta(days=generator.randrange(9000))
+                record["collection_date"] = generator.choice(
+                    [day.isoformat()[:4], day.isoformat()[:7], day.isoformat(), f"{day.isoformat()}T10:20:30Z"])
+            record["depth"] = f"{generator.randrange(20)}-{generator.randrange(20, 40)} cm"
+            cls.records.append(record)
+        builder = SampleIndexBuilder()
+        builder.add_all((record["samp_name"], record) for record in cls.records)
+        cls.index = builder.build(cell_degrees=5.0)
+
+    def brute_force(self, keep) -> list:
+        return [position for position, record in enumerate(self.records) if keep(record)]
+
+    def located(self, record):
+        if "lat_lon" not in record:
+            return None
+        return tuple(float(part) for part in record["lat_lon"].split())
+
+    def test_parse_collection_date(self):
+        """Truncated dates cover their period, offsets are applied, full stamps are one second."""
+        self.assertEqual(parse_collection_date("2008"), (epoch(2008, 1, 1), epoch(2009, 1, 1)))
+        self.assertEqual(parse_collection_date("2008-02"), (epoch(2008, 2, 1), epoch(2008, 3, 1)))
+        self.assertEqual(parse_collection_date("2008-12-31"), (epoch(2008, 12, 31), epoch(2009, 1, 1)))
+        self.assertEqual(parse_collection_date("2008-01-23T19:23:10+02:00"),
+                         (epoch(2008, 1, 23, 17, 23, 10), epoch(2008, 1, 23, 17, 23, 11)))
+        self.assertEqual(parse_collection_date("2008-01-23T19:23:10-00:30")[0], epoch(2008, 1, 23, 19, 53, 10))
+        self.assertEqual(parse_collection_date("2008-01-23T19:23:10Z"), parse_collection_date("2008-01-23T19:23:10"))
+        self.assertEqual(parse_collection_date(datetime.date(2008, 1, 23)), parse_collection_date("2008-01-23"))
+        self.assertEqual(parse_collection_date("2008-03/2008-05"), (epoch(2008, 3, 1), epoch(2008, 6, 1)))
+        for value in ["2008-13", "2008-02-30", "08-01-01", "2009/2008", "not collected"]:
+            self.assertIsNone(parse_collection_date(value), value)
+
+    def test_parse_measurement(self):
+        """Ranges and units become intervals in meters."""
+        self.assertEqual(parse_measurement("0-5 cm"), (0.0, 0.05))
+        self.assertEqual(parse_measurement("10"), (10.0, 10.0))
+        self.assertEqual(parse_measurement("2 ft"), (0.6096, 0.6096))
+        self.assertIsNone(parse_measurement("10 fathoms"))
+
+    def test_bbox(self):
+        """Boxes, including one across the antimeridian, match a full scan."""
+        for south, west, north, east in [(-10, -20, 30, 40), (80, 170, 90, -170), (-90, -180, 90, 180), (1, 1, 1, 1)]:
+            def inside(record):
+                point = self.located(record)
+                if point is None:
+                    return False
+                lon_inside = west <= point[1] <= east if west <= east else (point[1] >= west or point[1] <= east)
+                return south <= point[0] <= north and lon_inside
+
+            self.assertEqual(self.index.bbox(south, west, north, east).tolist(), self.brute_force(inside),
+                             (south, west, north, east))
+
+    def test_radius(self):
+        """Great-circle searches near the pole and across the antimeridian match a full scan."""
+        for lat, lon, km in [(0, 0, 2000), (88, 179, 300), (-30, -179.5, 800), (45, 90, 20000)]:
+            def near(record):
+                point = self.located(record)
+                return point is not None and great_circle_km(lat, lon, *point) <= km
+
+            self.assertEqual(self.index.radius(lat, lon, km).tolist(), self.brute_force(near), (lat, lon, km))
+
+    def test_date_range(self):
+        """Interval overlap matches a full scan, with a truncated end covering its whole period and None an open end."""
+        for start, end in [("2005-06-01", "2005-06-30"), ("2010", "2011"), ("1990", "2000-01-01"),
+                           ("2019", None), (None, "2003-02"), (None, None)]:
+            range_start = parse_collection_date(start)[0] if start else -math.inf
+            range_end = parse_collection_date(end)[1] if end else math.inf
+
+            def overlaps(record):
+                interval = parse_collection_date(record.get("collection_date", ""))
+                return interval is not None and interval[0] < range_end and interval[1] > range_start
+
+            self.assertEqual(self.index.date_range(start, end).tolist(), self.brute_force(overlaps), (start, end))
+
+    def test_save_and_query(self):
+        """A saved index loads back and combined queries intersect their parts."""
+        with tempfile.TemporaryDirectory() as directory:
+            index_file = os.path.join(directory, "index.npz")
+            self.index.save(index_file)
+            loaded = SampleIndex.load(index_file)
+        self.assertEqual(len(loaded), len(self.records))
+        combined = loaded.query(bbox=(-60, -180, 60, 180), start="2003", end="2008", depth=(0.3, None))
+        expected = np.intersect1d(self.index.bbox(-60, -180, 60, 180), self.index.date_range("2003", "2008"))
+        expected = self.index.measurement_range("depth", 0.3, None, expected)
+        self.assertEqual(combined.tolist(), expected.tolist())
+        self.assertTrue(len(combined))
+
+    def test_query_open_ends(self):
+        """query --from or --to alone leaves the other end open."""
+        runner = CliRunner()
+        with tempfile.TemporaryDirectory() as directory:
+            index_file = os.path.join(directory, "index.npz")
+            self.index.save(index_file)
+            for options, expected in [(["--from", "2019"], self.index.date_range("2019", None)),
+                                      (["--to", "2001"], self.index.date_range(None, "2001"))]:
+                result = runner.invoke(sample_index, ["query", "--index", index_file, "--limit", "100000"] + options)
+                self.assertEqual(result.exit_code, 0, result.output)
+                self.assertEqual(len(result.output.splitlines()), len(expected), options)
+                self.assertTrue(len(expected))
@@ -0,0 +1,83 @@
+"""Validation report test."""
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from scripts.compiled_schema import SlotRule
+from scripts.validation_report import OTHER_SHAPE, ValidationReport, read_classified_records, value_shape
+from tests.schemas import small_schema
+
+
+class TestValidationReport(unittest.TestCase):
+    """Aggregate errors by value shape with bounded samples."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.compiled = small_schema({
+            "samp_name": SlotRule("samp_name", required=True),
+            "depth": SlotRule("depth", pattern=r"^\d+(\.\d+)? m$"),
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_value_shape(self):
+        """Digits, letters and whitespace runs collapse; punctuation is kept."""
+        self.assertEqual(value_shape("10"), value_shape("250"))
+        self.assertEqual(value_shape("10 meter"), "9 a")
+        self.assertEqual(value_shape("0-5cm"), "9-9a")
+        self.assertEqual(value_shape("  12.5   m "), "9.9 a")
+        self.assertEqual([value_shape(v) for v in [None, True, 3, [], " "]],
+                         ["<missing>", "<boolean>", "<number>", "<list>", "<blank>"])
+
+    def test_groups(self):
+        """Same-shaped errors share a group whose rows and examples stay bounded."""
+        sidecar = os.path.join(self.directory.name, "errors.jsonl.gz")
+        with ValidationReport(sample_rows=3, examples=2, sidecar=sidecar) as report:
+            for row in range(100):
+                record = {"samp_name": f"s{row}", "depth": f"{row} meter"}
+                if row % 10 == 0:
+                    record = {"depth": "5 m"}
+                report.add(row, "MimsSoil", self.compiled.validate_record("MimsSoil", record))
+        summary = report.summary()
+        self.assertEqual((summary["records"], summary["invalid_records"], summary["errors"]), (100, 100, 100))
+        depth, missing = summary["problems"]
+        self.assertEqual((depth["slot"], depth["rule"], depth["shape"], depth["count"]),
+                         ("depth", "pattern", "9 a", 90))
+        self.assertEqual((depth["rows"], depth["examples"]), ([1, 2, 3], ["1 meter", "2 meter"]))
+        self.assertEqual((missing["rule"], missing["shape"], missing["count"]), ("required", "<missing>", 10))
+        self.assertEqual((missing["rows"], missing["examples"]), ([0, 10, 20], []))
+
+        with gzip.open(sidecar, "rt") as sidecar_handle:
+            lines = [json.loads(line) for line in sidecar_handle]
+        self.assertEqual(len(lines), 100)
+        self.assertEqual(lines[1]["errors"][0]["value"], "1 meter")
+
+        report_file = os.path.join(self.directory.name, "nested", "report.yaml")
+        report.write(report_file)
+        with open(report_file) as report_handle:
+            self.assertEqual(yaml.safe_load(report_handle)["problems"][0]["count"], 90)
+
+    def test_max_groups(self):
+        """Once max_groups is reached, new shapes are counted in <other>."""
+        report = ValidationReport(max_groups=2)
+        for row, value in enumerate(["1 meter", "a-b", "1/2", "x.y.z", "2 meter"]):
+            report.add(row, "MimsSoil", self.compiled.validate_record("MimsSoil", {"samp_name": "s", "depth": value}))
+        shapes = {problem["shape"]: problem["count"] for problem in report.summary()["problems"]}
+        self.assertEqual(shapes, {"9 a": 2, "a-a": 1, OTHER_SHAPE: 2})
+
+    def test_unknown_container(self):
+        """A document container that isn't a MixsCompliantData slot is reported, not fatal."""
+        document_file = os.path.join(self.directory.name, "document.yaml")
+        with open(document_file, "w") as document_handle:
+            yaml.safe_dump({"mims_soil_data": [{"samp_name": "s1"}], "soil_data": [{"samp_name": "s2"}]},
+                           document_handle)
+        classified = list(read_classified_records(document_file, self.compiled))
+        self.assertEqual([(row, class_name) for row, class_name, _ in classified],
+                         [("mims_soil_data:0", "MimsSoil"), ("soil_data:0", "soil_data")])
+        errors = self.compiled.validate_record(classified[1][1], classified[1][2])
+        self.assertEqual([error["rule"] for error in errors], ["class"])
@@ -0,0 +1,98 @@
+"""Validation service test."""
+import asyncio
+import gc
+import json
+import unittest
+import warnings
+
+from scripts.compiled_schema import SlotRule
+from scripts.validation_service import ValidationBatcher, ValidationService
+from tests.schemas import small_schema
+
+
+class TestValidationService(unittest.IsolatedAsyncioTestCase):
+    """Drive the HTTP/1.1 front end over a real socket."""
+
+    async def asyncSetUp(self):
+        compiled = small_schema({
+            "samp_name": SlotRule("samp_name", required=True),
+            "ph": SlotRule("ph", range="float"),
+            "lat_lon": SlotRule("lat_lon", required=True, pattern=r"^-?\d+(\.\d+)? -?\d+(\.\d+)?$"),
+        })
+        self.batcher = ValidationBatcher(compiled, max_batch_size=64, max_latency_ms=20)
+        self.batcher.start()
+        self.service = ValidationService(self.batcher.compiled, self.batcher)
+        self.server = await asyncio.start_server(self.service.handle_connection, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def request(self, method, path, body=None, headers=None, raw_body=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        payload = raw_body if raw_body is not None else (json.dumps(body).encode() if body is not None else b"")
+        head = {"Host": "test", "Connection": "close", "Content-Length": str(len(payload))}
+        head.update(headers or {})
+        lines = [f"{method} {path} HTTP/1.1"] + [f"{k}: {v}" for k, v in head.items() if v is not None]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        status_line, _, rest = response.partition(b"\r\n")
+        response_head, _, response_body = rest.partition(b"\r\n\r\n")
+        response_headers = dict(line.decode().split(": ", 1) for line in response_head.split(b"\r\n") if line)
+        return int(status_line.split()[1]), response_headers, response_body
+
+    async def test_validate_records(self):
+        """Concurrent requests are micro-batched and each gets its own errors back."""
+        valid = {"samp_name": "s1", "lat_lon": "45.1 45.9", "ph": "7.1"}
+        invalid = {"samp_name": "s2", "lat_lon": "45.1,45.9"}
+        results = await asyncio.gather(*[self.request("POST", "/validate/MimsSoil", record)
+                                         for record in [valid, invalid] * 5])
+        for index, (status, _, body) in enumerate(results):
+            self.assertEqual(status, 200)
+            response = json.loads(body)
+            self.assertEqual(response["valid"], index % 2 == 0)
+        self.assertEqual(json.loads(results[1][2])["errors"][0]["rule"], "pattern")
+        self.assertLess(self.batcher.batches, 10)
+
+        status, _, body = await self.request("POST", "/validate", {"mims_soil_data": [valid, {"samp_name": "s3"}]})
+        response = json.loads(body)
+        self.assertEqual((status, response["records"]), (200, 2))
+        self.assertEqual([(e["row"], e["slot"], e["rule"]) for e in response["errors"]], [(1, "lat_lon", "required")])
+
+    async def test_wrong_shapes(self):
+        """Valid JSON of the wrong shape is a 400, and nothing is left queued."""
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            for path, body in [("/validate/MimsSoil", [1, 2]),
+                               ("/validate/MimsSoil", "record"),
+                               ("/validate", {"mims_soil_data": {"a": 1}}),
+                               ("/validate", {"mims_soil_data": [{"samp_name": "s"}], "x": 3}),
+                               ("/validate", [])]:
+                status, _, _ = await self.request("POST", path, body)
+                self.assertEqual(status, 400, (path, body))
+            gc.collect()
+        self.assertFalse([w for w in caught if "never awaited" in str(w.message)])
+        self.assertEqual(self.batcher.records, 0)
+
+    async def test_framing(self):
+        """Bad Content-Length is a 400, chunked bodies a 411 that closes the connection."""
+        status, _, _ = await self.request("POST", "/validate/MimsSoil", raw_body=b"{}",
+                                          headers={"Content-Length": "two"})
+        self.assertEqual(status, 400)
+        status, headers, _ = await self.request(
+            "POST", "/validate/MimsSoil", raw_body=b"2\r\n{}\r\n0\r\n\r\n",
+            headers={"Content-Length": None, "Transfer-Encoding": "chunked", "Connection": None})
+        self.assertEqual((status, headers["Connection"]), (411, "close"))
+
+    async def test_metadata_etag(self):
+        """Metadata responses revalidate with If-None-Match."""
+        status, headers, body = await self.request("GET", "/slots/lat_lon")
+        self.assertEqual((status, json.loads(body)["classes"]), (200, ["MimsSoil"]))
+        status, _, body = await self.request("GET", "/slots/lat_lon", headers={"If-None-Match": headers["ETag"]})
+        self.assertEqual((status, body), (304, b""))
+        status, _, _ = await self.request("GET", "/classes/Unknown/slots")
+        self.assertEqual(status, 404)